@@ -0,0 +1,161 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import aiohttp
+except ImportError:  # aiohttp нужен только для асинхронного режима
+    aiohttp = None
+
+
+class AsyncTelegramClient:
+    """Асинхронный клиент Bot API поверх aiohttp"""
+
+    def __init__(self, base_url, session, max_retries=5):
+        self.base_url = base_url
+        self.session = session
+        self.max_retries = max_retries
+
+    async def call(self, method, params=None, timeout=30):
+        """Вызов метода Bot API; возвращает разобранный JSON или None"""
+        for _ in range(self.max_retries + 1):
+            try:
+                async with self.session.post(
+                    f"{self.base_url}/{method}",
+                    json=params,
+                    timeout=aiohttp.ClientTimeout(total=timeout)
+                ) as response:
+                    data = await response.json(content_type=None)
+            except asyncio.TimeoutError:
+                return None
+            except aiohttp.ClientError as e:
+                print(f"[NETWORK ERROR] {method}: {e}")
+                return None
+
+            if response.status == 429:
+                # Ждем столько, сколько просит Telegram, и повторяем
+                retry_after = data.get("parameters", {}).get("retry_after", 1)
+                await asyncio.sleep(retry_after)
+                continue
+            if response.status == 409:
+                return None
+            return data
+        return None
+
+
+class AsyncBotRuntime:
+    """Асинхронный цикл обработки обновлений для SignalBot
+
+    Обновления разных чатов обрабатываются одновременно, обновления одного
+    чата — строго по очереди. Обработчики SignalBot синхронные и вместе с
+    обращениями к базе выполняются в пуле потоков, не блокируя цикл событий;
+    ответы пользователям они отправляют через общий TelegramTransport с его
+    RateLimiter, асинхронно идут только getUpdates и answerCallbackQuery.
+    """
+
+    def __init__(self, bot, concurrency=32):
+        if aiohttp is None:
+            raise RuntimeError("Для асинхронного режима установите aiohttp: pip install aiohttp")
+
+        self.bot = bot
+        self.concurrency = concurrency
+        self.executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="async-handler")
+        self.client = None
+        self._semaphore = None
+        self._chat_locks = {}
+        self._tasks = set()
+
+    async def run_sync(self, func, *args):
+        """Выполнение синхронной функции бота в пуле потоков"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, func, *args)
+
+    async def dispatch(self, update):
+        """Обработка одного обновления с сохранением порядка внутри чата"""
+        chat_id = self.bot.get_update_chat_id(update)
+
+        # Блокировка чата живет, пока на нее есть хотя бы одно обновление
+        entry = self._chat_locks.get(chat_id)
+        if entry is None:
+            entry = [asyncio.Lock(), 0]
+            self._chat_locks[chat_id] = entry
+        entry[1] += 1
+        lock = entry[0]
+        try:
+            async with lock:
+                async with self._semaphore:
+                    if "message" in update:
+                        await self.run_sync(self.bot.process_message, update["message"])
+
+                    elif "callback_query" in update:
+                        await self.run_sync(self.bot.process_callback_query, update["callback_query"])
+                        # Безопасно отвечаем на callback, чтобы Telegram не ругался
+                        await self.client.call(
+                            "answerCallbackQuery",
+                            {"callback_query_id": update["callback_query"]["id"]}
+                        )
+        except Exception as e:
+            error_msg = f"[ERROR] Асинхронная обработка обновления: {e}"
+            print(error_msg)
+            await self.run_sync(self.bot.send_log, error_msg)
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                del self._chat_locks[chat_id]
+
+    def _spawn(self, coro):
+        task = asyncio.create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def main(self):
+        """Основной асинхронный цикл: long polling и запуск обработчиков"""
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+        connector = aiohttp.TCPConnector(limit=self.bot.transport.pool_size)
+
+        async with aiohttp.ClientSession(connector=connector) as session:
+            self.client = AsyncTelegramClient(self.bot.base_url, session)
+            self.bot.running = True
+            self.bot.start_background_threads()
+
+            # getUpdates не работает, пока установлен webhook (после запуска с --webhook)
+            await self.client.call("deleteWebhook")
+
+            print("[BOT] Запущен и готов (asyncio)")
+            await self.run_sync(self.bot.send_log, "[BOT] Запущен и готов (asyncio)")
+
+            offset = None
+            try:
+                while self.bot.running:
+                    params = {"timeout": 30}
+                    if offset:
+                        params["offset"] = offset
+
+                    result = await self.client.call("getUpdates", params, timeout=40)
+                    if not result or not result.get("ok"):
+                        await asyncio.sleep(1)
+                        continue
+
+                    updates = result.get("result", [])
+                    # Посты канала только ставятся в очередь стадии пересылки сигналов
+                    self.bot.check_signal_channel(updates)
+
+                    for update in updates:
+                        offset = update["update_id"] + 1
+                        self._spawn(self.dispatch(update))
+            finally:
+                self.bot.running = False
+                if self._tasks:
+                    await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def run(self):
+        """Запуск асинхронного режима до Ctrl+C"""
+        try:
+            asyncio.run(self.main())
+        except KeyboardInterrupt:
+            print("\n[BOT] Остановка...")
+            self.bot.signals.stop()
+            self.bot.send_log("[BOT] Остановлен")
+            self.bot.log_sink.close()
+            self.bot.outbox.stop()
+        finally:
+            self.executor.shutdown(wait=False)
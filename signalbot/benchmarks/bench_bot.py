@@ -0,0 +1,288 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Нагрузочные сценарии бота против локального fake_bot_api.py
+
+Запускает фейковый Bot API в отдельном процессе (его CPU не попадает в
+замер), направляет на него SignalBot через API_BASE_URL и прогоняет
+сценарии на временной базе:
+
+    start      — шторм /start от новых пользователей
+    fanout     — пересылка сигнала из канала N подписчикам
+    broadcast  — рассылка через очередь исходящих N подписчикам
+    screenshot — отправка скриншота оплаты N пользователями
+
+Для каждого сценария: число сообщений, сообщений в секунду, p50/p99
+задержки до последнего сообщения каждому получателю, CPU процесса бота и
+число отложенных по лимиту строк очереди исходящих. Если отложенных больше
+MAX_DEFERRED_RATIO на каждое сообщение, бенчмарк завершается с кодом 1:
+такое число значит, что обработчики очереди крутятся вхолостую.
+
+Запуск: python benchmarks/bench_bot.py [--users 200] [--scenarios start,fanout]
+        [--latency 30] [--rate-429 0.01] [--error-rate 0.001] [--rate-limit 30]
+"""
+
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import requests
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BOT_DIR = os.path.join(BENCH_DIR, "..")
+sys.path.insert(0, BOT_DIR)
+
+SCENARIOS = ("start", "fanout", "broadcast", "screenshot")
+
+# Диапазоны telegram_id, чтобы сценарии не пересекались
+START_USERS = 200000
+SUBSCRIBERS = 300000
+SCREENSHOT_USERS = 400000
+
+# Сколько отложенных строк очереди допустимо на одно доставленное сообщение
+MAX_DEFERRED_RATIO = 3
+
+
+def start_fake_api(args):
+    """Запуск fake_bot_api.py в отдельном процессе; возвращает (процесс, адрес)"""
+    command = [
+        sys.executable, os.path.join(BENCH_DIR, "fake_bot_api.py"),
+        "--port", str(args.port),
+        "--latency", str(args.latency),
+        "--jitter", str(args.jitter),
+        "--rate-429", str(args.rate_429),
+        "--retry-after", str(args.retry_after),
+        "--error-rate", str(args.error_rate),
+        "--seed", "1"
+    ]
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, text=True)
+    line = process.stdout.readline().strip()
+    return process, line.rsplit(" ", 1)[-1]
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def user_message(user_id, update_id, **fields):
+    message = {
+        "message_id": update_id,
+        "from": {"id": user_id, "is_bot": False, "first_name": "Bench", "username": f"bench{user_id}"},
+        "chat": {"id": user_id, "type": "private"},
+        "date": int(time.time())
+    }
+    message.update(fields)
+    return {"update_id": update_id, "message": message}
+
+
+class Bench:
+    def __init__(self, api_url, users, settle, stall, timeout):
+        self.api_url = api_url
+        self.users = users
+        self.settle = settle
+        self.stall = stall
+        self.timeout = timeout
+        self.http = requests.Session()
+        self.update_id = 1
+        self.bot = None
+
+    def start_bot(self, rate_limit):
+        import main
+        import pipeline
+
+        main.API_BASE_URL = self.api_url
+        if rate_limit:
+            main.RATE_LIMIT_GLOBAL = rate_limit
+        self.bot = main.SignalBot()
+        self.bot.running = True
+        self.bot.pipeline = pipeline.UpdatePipeline(self.bot, main.UPDATE_CONSUMERS, main.UPDATE_QUEUE_SIZE, poll_timeout=1)
+        self.bot.update_executor = self.bot.pipeline.executor
+        self.bot.pipeline.start()
+
+    def stop_bot(self):
+        self.bot.running = False
+        self.bot.pipeline.stop()
+        self.bot.signals.stop()
+        self.bot.log_sink.close()
+        self.bot.outbox.stop()
+
+    def inject(self, updates):
+        for update in updates:
+            update["update_id"] = self.update_id
+            self.update_id += 1
+        self.http.post(f"{self.api_url}/_bench/updates", json=updates).raise_for_status()
+
+    def subscribe(self, user_ids):
+        for user_id in user_ids:
+            self.bot.db.add_user(user_id, f"bench{user_id}")
+            self.bot.db.update_user_status(user_id, "active", plan="1m", end_date="2099-01-01T00:00:00")
+
+    def collect(self, targets, started_at):
+        """Ожидание, пока каждый получатель получит сообщения и новые перестанут приходить
+
+        Возвращает (сообщения, задержки по получателям в мс, длительность, не получивших ничего).
+        """
+        deadline = time.monotonic() + self.timeout
+        last_count = -1
+        last_change = time.monotonic()
+        while time.monotonic() < deadline:
+            deliveries = self.http.get(f"{self.api_url}/_bench/deliveries").json()
+            relevant = [(chat_id, at) for method, chat_id, at in deliveries if chat_id in targets]
+            if len(relevant) != last_count:
+                last_count = len(relevant)
+                last_change = time.monotonic()
+            else:
+                # Сообщения, потерянные из-за ошибок 5xx без повтора, ждать бесполезно
+                idle = time.monotonic() - last_change
+                if idle >= self.settle and len({chat_id for chat_id, _ in relevant}) == len(targets):
+                    break
+                if idle >= self.stall:
+                    break
+            time.sleep(0.05)
+
+        last_per_chat = {}
+        for chat_id, at in relevant:
+            last_per_chat[chat_id] = max(at, last_per_chat.get(chat_id, 0.0))
+        latencies = [(at - started_at) * 1000 for at in last_per_chat.values()]
+        duration = max(last_per_chat.values()) - started_at if last_per_chat else 0.0
+        missing = len(targets) - len(last_per_chat)
+        return len(relevant), latencies, duration, missing
+
+    def run(self, name):
+        self.http.post(f"{self.api_url}/_bench/reset").raise_for_status()
+        targets = getattr(self, f"prepare_{name}")()
+        deferred_started = self.bot.outbox.deferred
+        cpu_started = time.process_time()
+        started_at = time.time()
+        getattr(self, f"run_{name}")(targets)
+        messages, latencies, duration, missing = self.collect(set(targets), started_at)
+        cpu = time.process_time() - cpu_started
+        deferred = self.bot.outbox.deferred - deferred_started
+        stats = self.http.get(f"{self.api_url}/_bench/stats").json()
+        return {
+            "scenario": name,
+            "messages": messages,
+            "missing": missing,
+            "duration": duration,
+            "rate": messages / duration if duration else 0.0,
+            "p50": percentile(latencies, 0.5),
+            "p99": percentile(latencies, 0.99),
+            "cpu": cpu,
+            "deferred": deferred,
+            "throttled": stats["throttled"],
+            "errors": stats["errors"]
+        }
+
+    # Шторм /start: новые пользователи пишут боту одновременно
+    def prepare_start(self):
+        return [START_USERS + index for index in range(self.users)]
+
+    def run_start(self, targets):
+        self.inject([user_message(user_id, 0, text="/start") for user_id in targets])
+
+    # Пересылка поста сигнального канала всем подписчикам
+    def prepare_fanout(self):
+        targets = [SUBSCRIBERS + index for index in range(self.users)]
+        self.subscribe(targets)
+        return targets
+
+    def run_fanout(self, targets):
+        from config import SIGNAL_CHANNEL_ID
+        post = {
+            "message_id": self.update_id,
+            "chat": {"id": SIGNAL_CHANNEL_ID, "type": "channel"},
+            "date": int(time.time()),
+            "text": "BTC/USDT LONG"
+        }
+        self.inject([{"channel_post": post}])
+
+    # Рассылка администратора через очередь исходящих
+    def prepare_broadcast(self):
+        return [SUBSCRIBERS + index for index in range(self.users)]
+
+    def run_broadcast(self, targets):
+        self.bot.broadcast(targets, "Бенчмарк рассылки")
+
+    # Пользователи на шаге оплаты присылают скриншот
+    def prepare_screenshot(self):
+        targets = [SCREENSHOT_USERS + index for index in range(self.users)]
+        for user_id in targets:
+            self.bot.db.add_user(user_id, f"bench{user_id}")
+            self.bot.db.set_user_state(user_id, "waiting_screenshot_crypto_1m")
+        return targets
+
+    def run_screenshot(self, targets):
+        photo = [{"file_id": "bench-small", "width": 90, "height": 90}, {"file_id": "bench-large", "width": 1280, "height": 720}]
+        self.inject([user_message(user_id, 0, photo=photo) for user_id in targets])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--users", type=int, default=200, help="пользователей в сценарии")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS))
+    parser.add_argument("--port", type=int, default=18081, help="порт фейкового Bot API")
+    parser.add_argument("--latency", type=float, default=30, help="задержка ответа API, мс")
+    parser.add_argument("--jitter", type=float, default=10, help="разброс задержки, ± мс")
+    parser.add_argument("--rate-429", type=float, default=0.0, help="доля ответов 429")
+    parser.add_argument("--retry-after", type=int, default=1)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="доля ответов 500")
+    parser.add_argument("--rate-limit", type=float, default=None, help="глобальный лимит сообщений/с (по умолчанию из config)")
+    parser.add_argument("--settle", type=float, default=1.5, help="сколько секунд без новых сообщений считать концом сценария")
+    parser.add_argument("--stall", type=float, default=30, help="сколько секунд без новых сообщений считать, что остальные потеряны")
+    parser.add_argument("--timeout", type=float, default=300, help="предел длительности сценария, с")
+    args = parser.parse_args()
+
+    scenarios = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    for name in scenarios:
+        if name not in SCENARIOS:
+            parser.error(f"неизвестный сценарий: {name}")
+
+    # Бот работает во временном каталоге со своей базой и копией медиафайлов
+    workdir = tempfile.mkdtemp(prefix="signalbot-bench-")
+    os.makedirs(os.path.join(workdir, "data"))
+    for file_name in os.listdir(os.path.join(BOT_DIR, "data")):
+        if file_name.lower().endswith((".jpg", ".jpeg", ".png")):
+            shutil.copy(os.path.join(BOT_DIR, "data", file_name), os.path.join(workdir, "data"))
+    os.chdir(workdir)
+
+    process, api_url = start_fake_api(args)
+    bench = Bench(api_url, args.users, args.settle, args.stall, args.timeout)
+    results = []
+    try:
+        bench.start_bot(args.rate_limit)
+        for name in scenarios:
+            results.append(bench.run(name))
+    finally:
+        if bench.bot:
+            bench.stop_bot()
+        process.terminate()
+        process.wait()
+        os.chdir(BOT_DIR)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print(f"\nПользователей: {args.users}, задержка API {args.latency:.0f}±{args.jitter:.0f} мс, "
+          f"429: {args.rate_429:.1%}, ошибок: {args.error_rate:.1%}\n")
+    print(f"{'сценарий':<12}{'сообщ.':>8}{'нет':>6}{'время, с':>10}{'сообщ./с':>10}"
+          f"{'p50, мс':>10}{'p99, мс':>10}{'CPU, с':>8}{'CPU, %':>8}{'429':>6}{'5xx':>6}{'отлож.':>8}")
+    for result in results:
+        cpu_percent = result["cpu"] / result["duration"] * 100 if result["duration"] else 0.0
+        print(f"{result['scenario']:<12}{result['messages']:>8}{result['missing']:>6}{result['duration']:>10.2f}"
+              f"{result['rate']:>10.1f}{result['p50']:>10.0f}{result['p99']:>10.0f}"
+              f"{result['cpu']:>8.2f}{cpu_percent:>8.0f}{result['throttled']:>6}{result['errors']:>6}{result['deferred']:>8}")
+
+    spinning = [result for result in results if result["deferred"] > MAX_DEFERRED_RATIO * max(result["messages"], 1)]
+    for result in spinning:
+        print(f"\n[FAIL] {result['scenario']}: отложено {result['deferred']} строк на {result['messages']} сообщений "
+              f"(допустимо не больше {MAX_DEFERRED_RATIO} на сообщение)")
+    if spinning:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Замер задержки вызовов Database: соединение на каждый вызов против долгоживущего WAL-соединения
+
+Запуск: python benchmarks/bench_db.py [количество_пользователей] [количество_вызовов]
+"""
+
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from db import Database
+
+
+class PerCallDatabase(Database):
+    """Прежнее поведение: новое соединение и журнал отката на каждый вызов, без кэша состояний"""
+
+    def __init__(self, db_path):
+        super().__init__(db_path, state_cache_size=0)
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path)
+        conn.execute("PRAGMA journal_mode=DELETE")
+        return conn
+
+
+def measure(db, user_ids, calls):
+    """Средняя задержка (мкс) основных вызовов горячего пути process_message"""
+    results = {}
+    scenarios = [
+        ("get_user_state", lambda uid: db.get_user_state(uid)),
+        ("set_user_state", lambda uid: db.set_user_state(uid, "payment_intro")),
+        ("get_user", lambda uid: db.get_user(uid)),
+        ("user_exists", lambda uid: db.user_exists(uid))
+    ]
+    for name, call in scenarios:
+        started = time.perf_counter()
+        for i in range(calls):
+            call(user_ids[i % len(user_ids)])
+        results[name] = (time.perf_counter() - started) / calls * 1_000_000
+    return results
+
+
+def main():
+    users = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    calls = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        user_ids = list(range(1, users + 1))
+        report = {}
+        for label, cls in (("before", PerCallDatabase), ("after", Database)):
+            db = cls(os.path.join(tmp, f"data/{label}.db"))
+            for user_id in user_ids:
+                db.add_user(user_id, f"user{user_id}")
+            report[label] = measure(db, user_ids, calls)
+
+    print(f"Пользователей: {users}, вызовов на сценарий: {calls}\n")
+    print(f"{'вызов':<16}{'до, мкс':>12}{'после, мкс':>14}{'ускорение':>12}")
+    for name, before in report["before"].items():
+        after = report["after"][name]
+        print(f"{name:<16}{before:>12.1f}{after:>14.1f}{before / after:>11.1f}x")
+
+
+if __name__ == "__main__":
+    main()
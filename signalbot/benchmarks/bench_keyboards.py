@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Замер стоимости сборки тела sendMessage: клавиатура на каждый вызов против готовой RawJSON
+
+Запуск: python benchmarks/bench_keyboards.py [количество_вызовов]
+"""
+
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import keyboards
+from transport import encode_json
+
+# Клавиатуры обработчиков в прежнем виде: строки кнопок, собираемые на каждый вызов
+HANDLERS = {
+    "handle_start": ("reply", [
+        ["📈 Получать сигналы"], ["💰 Оплата"], ["ℹ️ Мой статус"], ["🧾 Поддержка", "🆘 Помощь"]
+    ], keyboards.MAIN_MENU),
+    "handle_payment_start": ("reply", [
+        ["1 месяц — 39 USDT"], ["3 месяца — 99 USDT"], ["Пожизненно — 239 USDT"], ["↩️ Назад"]
+    ], keyboards.PAYMENT_PLANS),
+    "handle_plan_selection": ("reply", [
+        ["💰 Оплатить криптой (TRC20)"], ["⚡ Оплатить через Tribute"], ["↩️ Назад"]
+    ], keyboards.PAYMENT_METHODS),
+    "handle_back": ("reply", [["↩️ Назад"]], keyboards.BACK),
+    "handle_admin_panel": ("inline", json.loads(keyboards.ADMIN_PANEL)["inline_keyboard"], keyboards.ADMIN_PANEL),
+    "handle_admin_quick_actions": ("inline", json.loads(keyboards.ADMIN_QUICK_ACTIONS)["inline_keyboard"], keyboards.ADMIN_QUICK_ACTIONS)
+}
+
+TEXT = "Выберите подходящий тариф:"
+
+
+def legacy_body(kind, rows):
+    """Прежний путь: create_*_keyboard, затем json.dumps всего тела в requests"""
+    if kind == "reply":
+        keyboard = []
+        for row in rows:
+            keyboard_row = []
+            for button in row:
+                keyboard_row.append(button)
+            keyboard.append(keyboard_row)
+        markup = {"keyboard": keyboard, "resize_keyboard": True, "one_time_keyboard": False}
+    else:
+        keyboard = []
+        for row in rows:
+            keyboard_row = []
+            for button in row:
+                keyboard_row.append({"text": button["text"], "callback_data": button["callback_data"]})
+            keyboard.append(keyboard_row)
+        markup = {"inline_keyboard": keyboard}
+    params = {"chat_id": 123456789, "text": TEXT, "parse_mode": "HTML", "reply_markup": markup}
+    return json.dumps(params).encode("utf-8")
+
+
+def frozen_body(markup):
+    """Новый путь: готовая клавиатура вставляется в тело как есть"""
+    params = {"chat_id": 123456789, "text": TEXT, "parse_mode": "HTML", "reply_markup": markup}
+    return encode_json(params)
+
+
+def measure(fn, args, calls):
+    started = time.perf_counter()
+    for _ in range(calls):
+        fn(*args)
+    return (time.perf_counter() - started) / calls * 1_000_000
+
+
+def main():
+    calls = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+
+    # Оба тела должны декодироваться в одинаковые параметры
+    for kind, rows, markup in HANDLERS.values():
+        assert json.loads(legacy_body(kind, rows)) == json.loads(frozen_body(markup))
+
+    print(f"Вызовов на обработчик: {calls}\n")
+    print(f"{'обработчик':<28}{'до, мкс':>10}{'после, мкс':>12}{'ускорение':>12}")
+    for name, (kind, rows, markup) in HANDLERS.items():
+        before = measure(legacy_body, (kind, rows), calls)
+        after = measure(frozen_body, (markup,), calls)
+        print(f"{name:<28}{before:>10.2f}{after:>12.2f}{before / after:>11.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Проверка планов запросов Database на синтетической базе (по умолчанию 1 000 000 пользователей)
+
+Для каждого метода перехватывается фактически выполненный SQL, печатается
+EXPLAIN QUERY PLAN и проверяется, что таблицы не читаются полным сканированием.
+Время вызова сравнивается с той же базой без индексов.
+
+Запуск: python benchmarks/bench_queries.py [количество_пользователей]
+"""
+
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from db import Database
+
+STATUSES = ["active"] * 10 + ["pending"] * 5 + ["expired"] * 20 + ["none"] * 65
+
+
+def populate(db, users):
+    """Заполнение базы пользователями и платежами с разбросом дат ±90 дней"""
+    rng = random.Random(42)
+    now = datetime.now()
+    conn = db._connect()
+
+    def user_rows():
+        for telegram_id in range(1, users + 1):
+            status = rng.choice(STATUSES)
+            joined = now - timedelta(seconds=rng.randint(0, 90 * 86400))
+            if status == "active":
+                # Активные подписки просрочены не больше суток: остальное уже закрыла проверка подписок
+                end = now + timedelta(seconds=rng.randint(-86400, 90 * 86400))
+            elif status != "none":
+                end = now + timedelta(seconds=rng.randint(-90 * 86400, 90 * 86400))
+            else:
+                end = None
+            yield (telegram_id, f"user{telegram_id}", status, "1m", joined.isoformat(),
+                   end.isoformat() if end else None, joined.isoformat())
+
+    def payment_rows():
+        for _ in range(users // 3):
+            created = now - timedelta(seconds=rng.randint(0, 90 * 86400))
+            yield (rng.randint(1, users), rng.choice(["pending", "confirmed", "sent_screenshot"]),
+                   "1m", created.isoformat())
+
+    with conn:
+        conn.executemany(
+            "INSERT INTO users (telegram_id, username, status, plan, joined_at, end_date, last_seen) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            user_rows()
+        )
+        conn.executemany(
+            "INSERT INTO payments (user_id, status, plan, created_at) VALUES (?, ?, ?, ?)",
+            payment_rows()
+        )
+    conn.execute("ANALYZE")
+
+
+def best_of(call, repeat=3):
+    """Лучшее время из repeat запусков, чтобы не мерить холодный кэш"""
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        call()
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def capture(db, call):
+    """Выполнить вызов Database и вернуть список выполненных SELECT"""
+    statements = []
+    conn = db._connect()
+    conn.set_trace_callback(statements.append)
+    try:
+        call()
+    finally:
+        conn.set_trace_callback(None)
+    return [sql for sql in statements if sql.lstrip().upper().startswith("SELECT")]
+
+
+def main():
+    users = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    tomorrow = datetime.now() + timedelta(days=1)
+    some_user = users // 2
+
+    # Полное сканирование допустимо только там, где его ограничивает LIMIT по индексу
+    checks = [
+        ("get_active_users", lambda db: db.get_active_users()),
+        ("get_expired_users", lambda db: db.get_expired_users()),
+        ("get_expiring_users", lambda db: db.get_expiring_users(tomorrow)),
+        ("get_daily_stats", lambda db: db.get_daily_stats()),
+        ("get_user_payment", lambda db: db.get_user_payment(some_user)),
+        ("get_latest_payments", lambda db: db.get_latest_payments(10))
+    ]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        db = Database(os.path.join(tmp, "data/users.db"))
+        print(f"Заполнение базы: {users} пользователей...")
+        started = time.perf_counter()
+        populate(db, users)
+        print(f"Готово за {time.perf_counter() - started:.1f} с\n")
+
+        conn = db._connect()
+        failures = []
+        timings = {}
+        for name, call in checks:
+            statements = capture(db, lambda: call(db))
+            elapsed = best_of(lambda: call(db))
+            timings[name] = [elapsed]
+            print(f"== {name} ({elapsed * 1000:.1f} мс)")
+            for sql in statements:
+                plan = [row[3] for row in conn.execute("EXPLAIN QUERY PLAN " + sql)]
+                for line in plan:
+                    print(f"   {line}")
+                    full_scan = line.startswith("SCAN") and "INDEX" not in line
+                    index_scan = line.startswith("SCAN") and "INDEX" in line and "LIMIT" not in sql.upper()
+                    if full_scan or index_scan:
+                        failures.append(f"{name}: {line}")
+            print()
+
+        # То же самое без индексов — для сравнения
+        indexes = [row[0] for row in conn.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'index' AND name LIKE 'idx_%'"
+        )]
+        with conn:
+            for index in indexes:
+                conn.execute(f"DROP INDEX {index}")
+        for name, call in checks:
+            timings[name].append(best_of(lambda: call(db)))
+
+    print(f"{'запрос':<22}{'с индексами, мс':>18}{'без индексов, мс':>20}")
+    for name, (indexed, plain) in timings.items():
+        print(f"{name:<22}{indexed * 1000:>18.1f}{plain * 1000:>20.1f}")
+
+    if failures:
+        print("\nПолное сканирование таблиц:")
+        for failure in failures:
+            print(f"  {failure}")
+        sys.exit(1)
+    print("\nВсе запросы используют индексы")
+
+
+if __name__ == "__main__":
+    main()
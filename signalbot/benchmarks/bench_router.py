@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Замер выбора обработчика: прежняя цепочка if/elif против таблиц Router
+
+Запуск: python benchmarks/bench_router.py [количество_сообщений]
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from router import Router
+
+BUTTONS = [
+    "📈 Получать сигналы", "🆘 Помощь", "💰 Оплата", "✅ Я оплатил",
+    "1 месяц — 39 USDT", "3 месяца — 99 USDT", "Пожизненно — 239 USDT",
+    "💰 Оплатить криптой (TRC20)", "⚡ Оплатить через Tribute", "📸 Отправить скрин",
+    "↩️ Назад", "ℹ️ Мой статус", "🧾 Поддержка"
+]
+COMMANDS = [
+    "start", "status", "users", "confirm", "payments", "broadcast", "stats", "help",
+    "test_log", "test_forward", "test_db", "net_stats", "admin", "panel"
+]
+CALLBACKS = [
+    "admin_users", "admin_payments", "admin_stats", "admin_broadcast", "admin_search",
+    "admin_quick", "admin_analytics", "admin_settings", "back_main", "back_admin_panel",
+    "quick_confirm_all", "quick_today_stats", "quick_update_statuses", "quick_test_message"
+]
+
+
+def legacy_match_text(text, user_state):
+    """Порядок проверок прежнего process_message"""
+    if text.startswith("/start"):
+        return "start"
+    for button in BUTTONS[:11]:
+        if text == button:
+            return button
+    if text == "ℹ️ Мой статус" or text.startswith("/status"):
+        return "status"
+    if text == "🧾 Поддержка":
+        return "support"
+    for command in COMMANDS[2:]:
+        if text.startswith("/" + command):
+            if command in ("confirm", "broadcast"):
+                args = text.split()[1:] if len(text.split()) > 1 else []
+                return command, args
+            return command
+    if user_state == "waiting_txid":
+        return "txid"
+    if user_state == "waiting_broadcast":
+        return "broadcast_text"
+    if user_state == "waiting_user_search":
+        return "search"
+    return None
+
+
+def legacy_match_callback(data):
+    """Порядок проверок прежнего process_callback_query"""
+    if data.startswith("plan_"):
+        return "plan", data.replace("plan_", "")
+    for callback in CALLBACKS[:8]:
+        if data == callback:
+            return callback
+    if data.startswith("confirm_"):
+        return "confirm", int(data.replace("confirm_", ""))
+    for callback in CALLBACKS[8:]:
+        if data == callback:
+            return callback
+    return None
+
+
+def build_router():
+    router = Router([1], lambda request, route: None)
+    for button in BUTTONS:
+        router.add_text(button, button)
+    for command in COMMANDS:
+        router.add_command(command, command)
+    for state in ("waiting_txid", "waiting_broadcast", "waiting_user_search"):
+        router.add_state(state, state)
+    for callback in CALLBACKS:
+        router.add_callback(callback, callback)
+    router.add_callback_prefix("plan_", "plan")
+    router.add_callback_prefix("confirm_", "confirm")
+    return router
+
+
+def router_match_text(router, text, user_state):
+    route, args = router.match_text(text)
+    if route is None:
+        route = router.match_state(user_state)
+    return route
+
+
+def measure(fn, items, rounds):
+    started = time.perf_counter()
+    for _ in range(rounds):
+        for item in items:
+            fn(*item)
+    return (time.perf_counter() - started) / (rounds * len(items)) * 1_000_000_000
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    router = build_router()
+
+    # Худшие для цепочки случаи — последние ветки и произвольный текст в состоянии
+    messages = [(button, None) for button in BUTTONS]
+    messages += [(f"/{command} 12345", None) for command in COMMANDS]
+    messages += [("произвольный текст", "waiting_broadcast"), ("TXID123", "waiting_txid"), ("привет", None)]
+    callbacks = [(data,) for data in CALLBACKS + ["plan_1m", "plan_lifetime", "confirm_123456"]]
+
+    rounds = max(1, count // len(messages))
+    rows = [
+        ("сообщения", measure(legacy_match_text, messages, rounds),
+         measure(lambda text, state: router_match_text(router, text, state), messages, rounds)),
+        ("callback", measure(legacy_match_callback, callbacks, rounds),
+         measure(router.match_callback, callbacks, rounds))
+    ]
+
+    print(f"Выборов обработчика на сценарий: ~{rounds * len(messages)}\n")
+    print(f"{'сценарий':<12}{'if/elif, нс':>14}{'Router, нс':>14}{'ускорение':>12}")
+    for name, before, after in rows:
+        print(f"{name:<12}{before:>14.0f}{after:>14.0f}{before / after:>11.1f}x")
+
+
+if __name__ == "__main__":
+    main()
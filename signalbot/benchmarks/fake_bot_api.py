@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Локальная замена Telegram Bot API для бенчмарков
+
+Отвечает на методы, которые вызывает бот, с заданной задержкой, долей
+ответов 429 (retry_after) и долей ошибок 500. Каждое исходящее сообщение
+(sendMessage, sendPhoto, forwardMessage и т.п.) записывается с временем
+получения. Служебные пути для бенчмарка:
+
+    POST /_bench/updates   — добавить обновления для getUpdates (JSON-массив)
+    GET  /_bench/deliveries — записанные сообщения [[method, chat_id, time], ...]
+    GET  /_bench/stats      — число вызовов по методам, 429 и ошибок
+    POST /_bench/reset      — очистить записи
+
+Запуск: python benchmarks/fake_bot_api.py [--port 8081] [--latency 30] [--jitter 10]
+        [--rate-429 0.01] [--retry-after 1] [--error-rate 0.001]
+
+Бот подключается через API_BASE_URL = "http://127.0.0.1:8081".
+"""
+
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Методы, которые доставляют сообщение в чат
+DELIVERY_METHODS = (
+    "sendMessage", "sendPhoto", "sendMediaGroup", "sendDocument",
+    "forwardMessage", "forwardMessages", "copyMessage", "copyMessages"
+)
+
+
+class FakeBotAPI:
+    """Состояние фейкового сервера: очередь обновлений, журнал сообщений, счетчики"""
+
+    def __init__(self, latency=0.0, jitter=0.0, rate_429=0.0, retry_after=1, error_rate=0.0, seed=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.rate_429 = rate_429
+        self.retry_after = retry_after
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+
+        self._lock = threading.Lock()
+        self._updates_ready = threading.Condition(self._lock)
+        self._updates = []
+        self._next_update_id = 1
+        self.deliveries = []
+        self.calls = {}
+        self.throttled = 0
+        self.errors = 0
+        self._message_id = 0
+
+    def reset(self):
+        with self._lock:
+            self.deliveries = []
+            self.calls = {}
+            self.throttled = 0
+            self.errors = 0
+
+    def add_updates(self, updates):
+        with self._lock:
+            for update in updates:
+                update.setdefault("update_id", self._next_update_id)
+                self._next_update_id = max(self._next_update_id, update["update_id"]) + 1
+                self._updates.append(update)
+            self._updates_ready.notify_all()
+
+    def get_updates(self, offset, timeout):
+        deadline = time.monotonic() + timeout
+        with self._lock:
+            if offset:
+                self._updates = [update for update in self._updates if update["update_id"] >= offset]
+            while not self._updates:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return []
+                self._updates_ready.wait(remaining)
+            return list(self._updates[:100])
+
+    def _next_message_id(self):
+        with self._lock:
+            self._message_id += 1
+            return self._message_id
+
+    def handle(self, method, params):
+        """Ответ на вызов метода: (HTTP-код, тело)"""
+        with self._lock:
+            self.calls[method] = self.calls.get(method, 0) + 1
+
+        if method == "getUpdates":
+            updates = self.get_updates(params.get("offset"), min(float(params.get("timeout", 0)), 5.0))
+            return 200, {"ok": True, "result": updates}
+
+        delay = self.latency + (self.random.uniform(-self.jitter, self.jitter) if self.jitter else 0.0)
+        if delay > 0:
+            time.sleep(delay)
+
+        if self.rate_429 and self.random.random() < self.rate_429:
+            with self._lock:
+                self.throttled += 1
+            return 429, {
+                "ok": False, "error_code": 429,
+                "description": f"Too Many Requests: retry after {self.retry_after}",
+                "parameters": {"retry_after": self.retry_after}
+            }
+        if self.error_rate and self.random.random() < self.error_rate:
+            with self._lock:
+                self.errors += 1
+            return 500, {"ok": False, "error_code": 500, "description": "Internal Server Error"}
+
+        if method in DELIVERY_METHODS:
+            chat_id = params.get("chat_id")
+            with self._lock:
+                self.deliveries.append((method, chat_id, time.time()))
+            return 200, {"ok": True, "result": self._message_result(method, params)}
+        return 200, {"ok": True, "result": True}
+
+    def _message_result(self, method, params):
+        chat = {"id": params.get("chat_id")}
+        if method == "sendPhoto":
+            file_id = f"fake-photo-{self._next_message_id()}"
+            return {"message_id": self._next_message_id(), "chat": chat, "photo": [{"file_id": file_id}]}
+        if method == "sendMediaGroup":
+            media = params.get("media") or []
+            if isinstance(media, str):
+                media = json.loads(media)
+            return [
+                {"message_id": self._next_message_id(), "chat": chat, "photo": [{"file_id": f"fake-photo-{self._next_message_id()}"}]}
+                for _ in media
+            ]
+        if method in ("forwardMessages", "copyMessages"):
+            return [{"message_id": self._next_message_id()} for _ in params.get("message_ids", [])]
+        return {"message_id": self._next_message_id(), "chat": chat, "date": int(time.time())}
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                "calls": dict(self.calls),
+                "deliveries": len(self.deliveries),
+                "throttled": self.throttled,
+                "errors": self.errors
+            }
+
+
+def _parse_params(handler, body):
+    """Параметры запроса: JSON, form-urlencoded или поля multipart (файлы пропускаются)"""
+    content_type = handler.headers.get("Content-Type", "")
+    if "application/json" in content_type:
+        return json.loads(body or b"{}")
+    if "multipart/form-data" in content_type:
+        boundary = content_type.split("boundary=", 1)[1].strip('"').encode()
+        params = {}
+        for part in body.split(b"--" + boundary):
+            head, _, value = part.partition(b"\r\n\r\n")
+            if b'name="' not in head or b"filename=" in head:
+                continue
+            name = head.split(b'name="', 1)[1].split(b'"', 1)[0].decode()
+            params[name] = value.rstrip(b"\r\n").decode("utf-8", "replace")
+        return _coerce_chat_id(params)
+    if body:
+        from urllib.parse import parse_qsl
+        return _coerce_chat_id(dict(parse_qsl(body.decode("utf-8"))))
+    return {}
+
+
+def _coerce_chat_id(params):
+    try:
+        params["chat_id"] = int(params["chat_id"])
+    except (KeyError, ValueError):
+        pass
+    return params
+
+
+def make_handler(api):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def _reply(self, code, payload):
+            body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+            self.send_response(code)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path == "/_bench/deliveries":
+                with api._lock:
+                    deliveries = list(api.deliveries)
+                self._reply(200, deliveries)
+            elif self.path == "/_bench/stats":
+                self._reply(200, api.get_stats())
+            else:
+                self._reply(404, {"ok": False, "error_code": 404, "description": "Not Found"})
+
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            if self.path == "/_bench/updates":
+                api.add_updates(json.loads(body))
+                self._reply(200, {"ok": True})
+                return
+            if self.path == "/_bench/reset":
+                api.reset()
+                self._reply(200, {"ok": True})
+                return
+
+            # /bot<token>/<method>
+            method = self.path.rsplit("/", 1)[-1]
+            try:
+                params = _parse_params(self, body)
+            except ValueError:
+                self._reply(400, {"ok": False, "error_code": 400, "description": "Bad Request: can't parse body"})
+                return
+            code, payload = api.handle(method, params)
+            self._reply(code, payload)
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+def serve(api, host="127.0.0.1", port=8081):
+    """Запуск сервера в фоновом потоке; возвращает ThreadingHTTPServer"""
+    server = ThreadingHTTPServer((host, port), make_handler(api))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="fake-bot-api", daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--latency", type=float, default=30, help="задержка ответа, мс")
+    parser.add_argument("--jitter", type=float, default=10, help="разброс задержки, ± мс")
+    parser.add_argument("--rate-429", type=float, default=0.0, help="доля ответов 429")
+    parser.add_argument("--retry-after", type=int, default=1, help="retry_after в ответах 429, с")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="доля ответов 500")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    api = FakeBotAPI(args.latency / 1000, args.jitter / 1000, args.rate_429, args.retry_after, args.error_rate, args.seed)
+    server = serve(api, args.host, args.port)
+    print(f"Fake Bot API: http://{args.host}:{server.server_port}", flush=True)
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
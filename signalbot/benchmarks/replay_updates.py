@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Отправка записанных обновлений Telegram на локальный webhook бота
+
+Файл обновлений — JSON-массив или по одному обновлению на строку (JSONL),
+например сохраненный вывод getUpdates. Без файла генерируются /start от
+--synthetic разных пользователей.
+
+Запуск: python benchmarks/replay_updates.py [updates.json] [--url URL] [--secret SECRET]
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from config import WEBHOOK_PATH, WEBHOOK_PORT, WEBHOOK_SECRET
+from webhook import SECRET_HEADER
+
+
+def load_updates(path):
+    """Чтение обновлений из JSON-массива, ответа getUpdates или JSONL"""
+    with open(path, encoding="utf-8") as f:
+        text = f.read().strip()
+    if text.startswith("["):
+        return json.loads(text)
+    if text.startswith("{") and '"result"' in text.split("\n", 1)[0]:
+        return json.loads(text)["result"]
+    return [json.loads(line) for line in text.splitlines() if line.strip()]
+
+
+def synthetic_updates(count):
+    """Команды /start от count разных пользователей"""
+    now = int(time.time())
+    return [
+        {
+            "update_id": index + 1,
+            "message": {
+                "message_id": index + 1,
+                "from": {"id": 100000 + index, "is_bot": False, "first_name": "Test", "username": f"user{index}"},
+                "chat": {"id": 100000 + index, "type": "private"},
+                "date": now,
+                "text": "/start"
+            }
+        }
+        for index in range(count)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("file", nargs="?", help="файл с обновлениями (JSON или JSONL)")
+    parser.add_argument("--url", default=f"http://127.0.0.1:{WEBHOOK_PORT}{WEBHOOK_PATH}")
+    parser.add_argument("--secret", default=WEBHOOK_SECRET)
+    parser.add_argument("--synthetic", type=int, default=100, help="число синтетических /start без файла")
+    parser.add_argument("--concurrency", type=int, default=8)
+    args = parser.parse_args()
+
+    updates = load_updates(args.file) if args.file else synthetic_updates(args.synthetic)
+    session = requests.Session()
+    session.headers[SECRET_HEADER] = args.secret
+
+    def post(update):
+        started = time.perf_counter()
+        try:
+            status = session.post(args.url, json=update, timeout=10).status_code
+        except requests.exceptions.RequestException:
+            status = "error"
+        return status, time.perf_counter() - started
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        results = list(executor.map(post, updates))
+    duration = time.perf_counter() - started
+
+    statuses = {}
+    for status, _ in results:
+        statuses[status] = statuses.get(status, 0) + 1
+    latencies = sorted(latency for _, latency in results)
+
+    print(f"Отправлено обновлений: {len(updates)} за {duration:.2f}s ({len(updates) / duration:.0f}/s)")
+    print(f"Ответы: {', '.join(f'{status}: {count}' for status, count in sorted(statuses.items(), key=str))}")
+    if latencies:
+        print(f"Задержка ответа: p50={latencies[len(latencies) // 2] * 1000:.1f}ms, "
+              f"p99={latencies[int(len(latencies) * 0.99)] * 1000:.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
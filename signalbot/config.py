@@ -3,6 +3,9 @@
 # Токен бота от @BotFather
 TOKEN = "8327664202:AAFqo9QTosrzE0eESU69uDzscjiaa-R-50c"
 
+# Адрес Bot API (для бенчмарков — локальный benchmarks/fake_bot_api.py)
+API_BASE_URL = "https://api.telegram.org"
+
 # ID администраторов (список)
 ADMIN_IDS = [5506126690, 612781324]
 
@@ -29,6 +32,61 @@ LOG_CHANNEL_ID = -1003038695844
 # Интервал проверки новых сообщений (секунды)
 CHECK_INTERVAL = 10
 
+# Размер пула keep-alive соединений к Telegram API
+HTTP_POOL_SIZE = 32
+
+# Количество параллельных потоков рассылки сигналов
+FANOUT_WORKERS = 16
+
+# Сколько секунд ждать остальные посты альбома сигнала (media_group_id) перед пересылкой
+SIGNAL_ALBUM_WINDOW = 1.5
+
+# Логи в канал: отправляются пачками раз в LOG_FLUSH_INTERVAL секунд; очередь ограничена LOG_QUEUE_SIZE строками
+# (не чаще 3 с: лимит Telegram — 20 сообщений в минуту в один канал)
+LOG_FLUSH_INTERVAL = 3
+LOG_QUEUE_SIZE = 1000
+
+# Очередь исходящих сообщений: число потоков-отправителей и попыток до перевода в недоставленные
+OUTBOX_WORKERS = 4
+OUTBOX_MAX_ATTEMPTS = 6
+
+# Кэш состояний пользователей в памяти: максимум записей и время жизни записи (секунды)
+STATE_CACHE_SIZE = 10000
+STATE_CACHE_TTL = 600
+
+# Асинхронный режим (asyncio + aiohttp) вместо потокового; также включается флагом --async
+ASYNC_MODE = False
+
+# Сколько обновлений асинхронный режим обрабатывает одновременно
+ASYNC_CONCURRENCY = 32
+
+# Режим webhook: Telegram сам присылает обновления на WEBHOOK_URL
+WEBHOOK_MODE = False
+WEBHOOK_HOST = "0.0.0.0"
+WEBHOOK_PORT = 8443
+WEBHOOK_PATH = "/webhook"
+# Публичный HTTPS-адрес для setWebhook (пусто — не регистрировать)
+WEBHOOK_URL = ""
+# Секрет из заголовка X-Telegram-Bot-Api-Secret-Token (пусто — случайный при запуске)
+WEBHOOK_SECRET = ""
+WEBHOOK_WORKERS = 8
+WEBHOOK_QUEUE_SIZE = 1000
+
+# Конвейер long polling: число обработчиков и общий размер очереди обновлений
+UPDATE_CONSUMERS = 8
+UPDATE_QUEUE_SIZE = 1000
+
+# Как часто (сек) сверять список получателей сигналов с базой
+RECIPIENT_RECONCILE_INTERVAL = 600
+
+# Лимиты Telegram: всего сообщений в секунду, в секунду на один чат, в минуту на группу/канал
+RATE_LIMIT_GLOBAL = 30
+RATE_LIMIT_PER_CHAT = 1
+RATE_LIMIT_PER_GROUP = 20
+
+# Сколько раз повторять запрос после ответа 429 (Too Many Requests)
+RATE_LIMIT_MAX_RETRIES = 5
+
 # Статусы пользователей
 STATUS_PENDING = "pending"    # Ожидает подтверждения оплаты
 STATUS_ACTIVE = "active"      # Активная подписка
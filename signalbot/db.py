@@ -1,82 +1,83 @@
 import sqlite3
 import os
-import shutil
+import json
+import threading
 from datetime import datetime, timedelta
 
+from migrations import apply_migrations
+from state_cache import StateCache
+
 class Database:
-    def __init__(self, db_path="data/users.db"):
+    # Сколько миллисекунд ждать снятия блокировки другим потоком
+    BUSY_TIMEOUT_MS = 5000
+    # Размер кэша подготовленных выражений на одно соединение
+    CACHED_STATEMENTS = 256
+    # Кому пересылаются сигналы и рассылки (параметр — текущее время в ISO)
+    ACTIVE_RECIPIENT_CONDITION = '''
+        status = 'active' AND (end_date > ? OR end_date IS NULL OR plan = 'lifetime')
+        AND unreachable_at IS NULL
+    '''
+
+    def __init__(self, db_path="data/users.db", state_cache_size=10000, state_cache_ttl=600):
         """Инициализация базы данных"""
         self.db_path = db_path
         self.backup_dir = "data/backups"
+        self._local = threading.local()
+        self.state_cache = StateCache(state_cache_size, state_cache_ttl)
+        self._status_listeners = []
         self.init_database()
     
+    def _connect(self):
+        """Долгоживущее соединение текущего потока (WAL, кэш выражений)"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(
+                self.db_path,
+                timeout=self.BUSY_TIMEOUT_MS / 1000,
+                cached_statements=self.CACHED_STATEMENTS
+            )
+            # WAL позволяет читать параллельно с записью, а NORMAL убирает fsync на каждый коммит
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(f"PRAGMA busy_timeout={self.BUSY_TIMEOUT_MS}")
+            self._local.conn = conn
+        return conn
+    
+    def add_status_listener(self, listener):
+        """Подписка на изменения статусов: listener(telegram_id, status, end_date) после коммита"""
+        self._status_listeners.append(listener)
+    
+    def _notify_status(self, changes):
+        for telegram_id, status, end_date in changes:
+            for listener in self._status_listeners:
+                try:
+                    listener(telegram_id, status, end_date)
+                except Exception as e:
+                    print(f"[ERROR] Обработчик изменения статуса: {e}")
+    
+    @staticmethod
+    def _day_bounds(day):
+        """Границы суток [начало, начало следующих) в ISO-формате для сравнения по индексу"""
+        if isinstance(day, datetime):
+            day = day.date()
+        start = datetime.combine(day, datetime.min.time())
+        return start.isoformat(), (start + timedelta(days=1)).isoformat()
+    
+    def close(self):
+        """Закрытие соединения текущего потока"""
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+    
     def init_database(self):
         """Создание базы данных и таблиц при первом запуске"""
         # Создаем папки если их нет
         os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
         os.makedirs(self.backup_dir, exist_ok=True)
         
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
-            
-            # Создаем таблицу пользователей
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS users (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    telegram_id INTEGER UNIQUE NOT NULL,
-                    username TEXT,
-                    status TEXT DEFAULT 'none',
-                    plan TEXT DEFAULT 'none',
-                    start_date TEXT,
-                    end_date TEXT,
-                    joined_at TEXT NOT NULL,
-                    last_seen TEXT
-                )
-            ''')
-            
-            # Создаем таблицу платежей
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS payments (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    user_id INTEGER NOT NULL,
-                    txid TEXT,
-                    screenshot_file_id TEXT,
-                    status TEXT DEFAULT 'pending',
-                    payment_method TEXT DEFAULT 'crypto',
-                    plan TEXT,
-                    created_at TEXT NOT NULL,
-                    FOREIGN KEY (user_id) REFERENCES users (telegram_id)
-                )
-            ''')
-            
-            # Добавляем отсутствующие колонки (для совместимости)
-            try:
-                cursor.execute("ALTER TABLE users ADD COLUMN user_state TEXT")
-            except sqlite3.OperationalError:
-                pass  # Колонка уже существует
-            
-            try:
-                cursor.execute("ALTER TABLE users ADD COLUMN plan TEXT DEFAULT 'none'")
-            except sqlite3.OperationalError:
-                pass  # Колонка уже существует
-                
-            try:
-                cursor.execute("ALTER TABLE users ADD COLUMN last_seen TEXT")
-            except sqlite3.OperationalError:
-                pass  # Колонка уже существует
-            
-            # Добавляем новые колонки в таблицу платежей
-            try:
-                cursor.execute("ALTER TABLE payments ADD COLUMN payment_method TEXT DEFAULT 'crypto'")
-            except sqlite3.OperationalError:
-                pass  # Колонка уже существует
-            
-            try:
-                cursor.execute("ALTER TABLE payments ADD COLUMN plan TEXT")
-            except sqlite3.OperationalError:
-                pass  # Колонка уже существует
-            
-            conn.commit()
+        # Создаем и обновляем схему версионированными миграциями
+        apply_migrations(self._connect())
     
     def create_backup(self):
         """Создание резервной копии базы данных"""
@@ -88,8 +89,13 @@ class Database:
             backup_filename = f"users_{timestamp}.db"
             backup_path = os.path.join(self.backup_dir, backup_filename)
             
-            # Копируем файл базы данных
-            shutil.copy2(self.db_path, backup_path)
+            # Копируем базу через backup API: простое копирование файла в режиме WAL
+            # потеряло бы изменения, еще не перенесенные из журнала
+            backup_conn = sqlite3.connect(backup_path)
+            try:
+                self._connect().backup(backup_conn)
+            finally:
+                backup_conn.close()
             
             # Удаляем старые бэкапы (старше 30 дней)
             self.cleanup_old_backups()
@@ -117,7 +123,7 @@ class Database:
     
     def add_user(self, telegram_id, username=None):
         """Добавление нового пользователя"""
-        with sqlite3.connect(self.db_path) as conn:
+        with self._connect() as conn:
             cursor = conn.cursor()
             
             try:
@@ -139,7 +145,7 @@ class Database:
     
     def get_user(self, telegram_id):
         """Получение информации о пользователе"""
-        with sqlite3.connect(self.db_path) as conn:
+        with self._connect() as conn:
             cursor = conn.cursor()
             
             cursor.execute('''
@@ -163,7 +169,7 @@ class Database:
     
     def update_user_status(self, telegram_id, status, plan=None, start_date=None, end_date=None):
         """Обновление статуса пользователя"""
-        with sqlite3.connect(self.db_path) as conn:
+        with self._connect() as conn:
             cursor = conn.cursor()
             
             if start_date and plan:
@@ -171,38 +177,105 @@ class Database:
                     UPDATE users 
                     SET status = ?, plan = ?, start_date = ?, end_date = ?
                     WHERE telegram_id = ?
+                    RETURNING end_date
                 ''', (status, plan, start_date, end_date, telegram_id))
             elif plan:
                 cursor.execute('''
                     UPDATE users 
                     SET status = ?, plan = ?
                     WHERE telegram_id = ?
+                    RETURNING end_date
                 ''', (status, plan, telegram_id))
             else:
                 cursor.execute('''
                     UPDATE users 
                     SET status = ?
                     WHERE telegram_id = ?
+                    RETURNING end_date
                 ''', (status, telegram_id))
             
+            row = cursor.fetchone()
             conn.commit()
-            return cursor.rowcount > 0
+        
+        if row is None:
+            return False
+        self._notify_status([(telegram_id, status, row[0])])
+        return True
     
     def get_active_users(self):
         """Получение списка активных пользователей с неистёкшей подпиской"""
-        with sqlite3.connect(self.db_path) as conn:
+        with self._connect() as conn:
             cursor = conn.cursor()
             
-            cursor.execute('''
-                SELECT telegram_id FROM users 
-                WHERE status = 'active' AND (end_date > ? OR end_date IS NULL OR plan = 'lifetime')
-            ''', (datetime.now().isoformat(),))
+            cursor.execute(
+                f'SELECT telegram_id FROM users WHERE {self.ACTIVE_RECIPIENT_CONDITION}',
+                (datetime.now().isoformat(),)
+            )
             
             return [row[0] for row in cursor.fetchall()]
     
+    def is_active_recipient(self, telegram_id):
+        """Проверка одного пользователя по тому же условию, что и get_active_users"""
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                f'SELECT 1 FROM users WHERE telegram_id = ? AND {self.ACTIVE_RECIPIENT_CONDITION}',
+                (telegram_id, datetime.now().isoformat())
+            )
+            return cursor.fetchone() is not None
+    
+    def mark_unreachable(self, telegram_id, reason):
+        """Отметка пользователя, которому Telegram больше не доставляет сообщения; True, если отметка новая"""
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            
+            cursor.execute('''
+                UPDATE users SET unreachable_at = ?, unreachable_reason = ?
+                WHERE telegram_id = ? AND unreachable_at IS NULL
+                RETURNING status, end_date
+            ''', (datetime.now().isoformat(), reason, telegram_id))
+            
+            marked = cursor.fetchone()
+            conn.commit()
+        
+        # Статус подписки не меняется; слушатели сами перепроверяют, кому слать сигналы
+        if marked:
+            self._notify_status([(telegram_id, marked[0], marked[1])])
+        return marked is not None
+    
+    def clear_unreachable(self, telegram_id):
+        """Снятие отметки недоступности (пользователь снова пишет боту); True, если отметка была"""
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            
+            cursor.execute('''
+                UPDATE users SET unreachable_at = NULL, unreachable_reason = NULL
+                WHERE telegram_id = ? AND unreachable_at IS NOT NULL
+                RETURNING status, end_date
+            ''', (telegram_id,))
+            
+            restored = cursor.fetchone()
+            conn.commit()
+        
+        # Активный подписчик возвращается в рассылку сигналов
+        if restored:
+            self._notify_status([(telegram_id, restored[0], restored[1])])
+        return restored is not None
+    
+    def get_unreachable_stats(self):
+        """Количество недоступных пользователей по причинам"""
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT unreachable_reason, COUNT(*) FROM users
+                WHERE unreachable_at IS NOT NULL
+                GROUP BY unreachable_reason
+            ''')
+            return dict(cursor.fetchall())
+    
     def get_all_users(self):
         """Получение списка всех пользователей"""
-        with sqlite3.connect(self.db_path) as conn:
+        with self._connect() as conn:
             cursor = conn.cursor()
             
             cursor.execute('''
@@ -214,15 +287,15 @@ class Database:
     
     def user_exists(self, telegram_id):
         """Проверка существования пользователя"""
-        with sqlite3.connect(self.db_path) as conn:
+        with self._connect() as conn:
             cursor = conn.cursor()
             
             cursor.execute('SELECT 1 FROM users WHERE telegram_id = ?', (telegram_id,))
             return cursor.fetchone() is not None
     
     def set_user_state(self, telegram_id, state):
-        """Установка состояния пользователя"""
-        with sqlite3.connect(self.db_path) as conn:
+        """Установка состояния пользователя (запись в базу, затем в кэш)"""
+        with self._connect() as conn:
             cursor = conn.cursor()
             
             cursor.execute('''
@@ -230,11 +303,21 @@ class Database:
             ''', (state, telegram_id))
             
             conn.commit()
-            return cursor.rowcount > 0
+            updated = cursor.rowcount > 0
+        
+        if updated:
+            self.state_cache.set(telegram_id, state)
+        else:
+            self.state_cache.invalidate(telegram_id)
+        return updated
     
     def get_user_state(self, telegram_id):
-        """Получение состояния пользователя"""
-        with sqlite3.connect(self.db_path) as conn:
+        """Получение состояния пользователя (из кэша, при промахе — из базы)"""
+        found, state = self.state_cache.get(telegram_id)
+        if found:
+            return state
+        
+        with self._connect() as conn:
             cursor = conn.cursor()
             
             cursor.execute('''
@@ -242,11 +325,14 @@ class Database:
             ''', (telegram_id,))
             
             result = cursor.fetchone()
-            return result[0] if result else None
+            state = result[0] if result else None
+        
+        self.state_cache.add(telegram_id, state)
+        return state
     
     def add_payment(self, user_id, txid=None, screenshot_file_id=None, status="pending", payment_method="crypto", plan=None):
         """Добавление платежа"""
-        with sqlite3.connect(self.db_path) as conn:
+        with self._connect() as conn:
             cursor = conn.cursor()
             
             try:
@@ -294,7 +380,7 @@ class Database:
                 WHERE user_id = ?
             """
             
-            with sqlite3.connect(self.db_path) as conn:
+            with self._connect() as conn:
                 cursor = conn.cursor()
                 cursor.execute(query, params)
                 conn.commit()
@@ -305,9 +391,58 @@ class Database:
             return False
 
     
+    def confirm_pending_users(self, plans, now=None):
+        """Активация всех pending-пользователей с известным тарифом одной транзакцией
+
+        plans — словарь тарифов (PLANS); срок считается от now по plans[plan]["days"],
+        None означает бессрочный тариф. Ожидающие платежи пользователей помечаются
+        confirmed. Возвращает (список активированных, всего pending).
+        """
+        now = now or datetime.now()
+        conn = self._connect()
+        # IMMEDIATE: выборка и обновления видят одно и то же состояние
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            pending = conn.execute('''
+                SELECT telegram_id, username, plan
+                FROM users
+                WHERE status = 'pending'
+            ''').fetchall()
+            
+            confirmed = []
+            for telegram_id, username, plan_key in pending:
+                plan = plans.get(plan_key)
+                if not plan:
+                    continue
+                end_date = None if plan["days"] is None else (now + timedelta(days=plan["days"])).isoformat()
+                confirmed.append({
+                    'telegram_id': telegram_id,
+                    'username': username,
+                    'plan': plan_key,
+                    'end_date': end_date
+                })
+            
+            conn.executemany('''
+                UPDATE users 
+                SET status = 'active', start_date = ?, end_date = ?
+                WHERE telegram_id = ?
+            ''', [(now.isoformat(), user['end_date'], user['telegram_id']) for user in confirmed])
+            conn.executemany('''
+                UPDATE payments 
+                SET status = 'confirmed'
+                WHERE user_id = ? AND status IN ('pending', 'sent_screenshot', 'sent_txid')
+            ''', [(user['telegram_id'],) for user in confirmed])
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        
+        self._notify_status([(user['telegram_id'], 'active', user['end_date']) for user in confirmed])
+        return confirmed, len(pending)
+    
     def get_user_payment(self, user_id):
         """Получение информации о последнем платеже пользователя"""
-        with sqlite3.connect(self.db_path) as conn:
+        with self._connect() as conn:
             cursor = conn.cursor()
             
             cursor.execute('''
@@ -330,9 +465,210 @@ class Database:
                 }
             return None
     
+    def get_state(self, key, default=None):
+        """Значение из служебной таблицы bot_state"""
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            
+            cursor.execute('''
+                SELECT value FROM bot_state WHERE key = ?
+            ''', (key,))
+            
+            result = cursor.fetchone()
+            return result[0] if result else default
+    
+    def set_state(self, key, value):
+        """Сохранение значения в служебной таблице bot_state"""
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            
+            cursor.execute('''
+                INSERT INTO bot_state (key, value, updated_at) VALUES (?, ?, ?)
+                ON CONFLICT(key) DO UPDATE SET value = excluded.value, updated_at = excluded.updated_at
+            ''', (key, value, datetime.now().isoformat()))
+            
+            conn.commit()
+    
+    def get_media_file_id(self, content_hash):
+        """Получение file_id ранее загруженного файла по хэшу содержимого"""
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            
+            cursor.execute('''
+                SELECT file_id FROM media_cache WHERE content_hash = ?
+            ''', (content_hash,))
+            
+            result = cursor.fetchone()
+            return result[0] if result else None
+    
+    def save_media_file_id(self, content_hash, file_id, file_name=None):
+        """Сохранение file_id загруженного файла"""
+        with self._connect() as conn:
+            conn.execute('''
+                INSERT OR REPLACE INTO media_cache (content_hash, file_id, file_name, updated_at)
+                VALUES (?, ?, ?, ?)
+            ''', (content_hash, file_id, file_name, datetime.now().isoformat()))
+    
+    def delete_media_file_id(self, content_hash):
+        """Удаление недействительного file_id"""
+        with self._connect() as conn:
+            conn.execute('DELETE FROM media_cache WHERE content_hash = ?', (content_hash,))
+    
+    def enqueue_outbound(self, method, params_list, priority):
+        """Постановка запросов в очередь исходящих одной транзакцией"""
+        now = datetime.now().isoformat()
+        ready_at = datetime.now().timestamp()
+        with self._connect() as conn:
+            conn.executemany('''
+                INSERT INTO outbound_queue (method, params, priority, next_attempt_at, created_at)
+                VALUES (?, ?, ?, ?, ?)
+            ''', [(method, params, priority, ready_at, now) for params in params_list])
+    
+    def claim_outbound(self, now):
+        """Захват следующего готового запроса с наивысшим приоритетом"""
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            
+            cursor.execute('''
+                UPDATE outbound_queue SET status = 'sending', attempts = attempts + 1
+                WHERE id = (
+                    SELECT id FROM outbound_queue
+                    WHERE status = 'pending' AND next_attempt_at <= ?
+                    ORDER BY priority, next_attempt_at
+                    LIMIT 1
+                )
+                RETURNING id, method, params, priority, attempts
+            ''', (now,))
+            
+            return cursor.fetchone()
+    
+    def complete_outbound(self, queue_id):
+        """Удаление доставленного запроса из очереди"""
+        with self._connect() as conn:
+            conn.execute('DELETE FROM outbound_queue WHERE id = ?', (queue_id,))
+    
+    def retry_outbound(self, queue_id, next_attempt_at, error):
+        """Возврат запроса в очередь для повторной попытки"""
+        with self._connect() as conn:
+            conn.execute('''
+                UPDATE outbound_queue SET status = 'pending', next_attempt_at = ?, last_error = ?
+                WHERE id = ?
+            ''', (next_attempt_at, error, queue_id))
+    
+    def defer_outbound(self, queue_id, next_attempt_at):
+        """Откладывание запроса до освобождения лимита без траты попытки"""
+        with self._connect() as conn:
+            conn.execute('''
+                UPDATE outbound_queue SET status = 'pending', attempts = attempts - 1, next_attempt_at = ?
+                WHERE id = ?
+            ''', (next_attempt_at, queue_id))
+    
+    def dead_letter_outbound(self, queue_id, error):
+        """Перевод запроса в dead letter после исчерпания попыток"""
+        with self._connect() as conn:
+            conn.execute('''
+                UPDATE outbound_queue SET status = 'dead', last_error = ? WHERE id = ?
+            ''', (error, queue_id))
+    
+    def reset_outbound_in_flight(self):
+        """Возврат в очередь запросов, которые отправлялись в момент остановки"""
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            cursor.execute("UPDATE outbound_queue SET status = 'pending' WHERE status = 'sending'")
+            return cursor.rowcount
+    
+    def get_outbound_stats(self):
+        """Количество запросов в очереди по статусам"""
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT status, COUNT(*) FROM outbound_queue GROUP BY status')
+            return dict(cursor.fetchall())
+    
+    def start_signal(self, signal_id, message_ids, recipients):
+        """Запись о начале рассылки сигнала (повторный вызов при возобновлении ничего не меняет)"""
+        with self._connect() as conn:
+            conn.execute('''
+                INSERT OR IGNORE INTO signals (signal_id, message_ids, recipients, status, created_at)
+                VALUES (?, ?, ?, 'running', ?)
+            ''', (signal_id, json.dumps(message_ids), recipients, datetime.now().isoformat()))
+    
+    def claim_signal_delivery(self, signal_id, recipient_id):
+        """Захват отправки сигнала получателю; False, если она уже захвачена другой рассылкой
+
+        Запись создается до отправки, поэтому рассылка после перезапуска и
+        одновременно пришедший повтор поста не отправят сигнал дважды.
+        """
+        with self._connect() as conn:
+            cursor = conn.execute('''
+                INSERT OR IGNORE INTO signal_deliveries (signal_id, recipient_id, delivered)
+                VALUES (?, ?, 0)
+            ''', (signal_id, recipient_id))
+            return cursor.rowcount > 0
+    
+    def record_signal_delivery(self, signal_id, recipient_id):
+        """Отметка об успешной отправке захваченного сигнала"""
+        with self._connect() as conn:
+            conn.execute('''
+                UPDATE signal_deliveries SET delivered = 1 WHERE signal_id = ? AND recipient_id = ?
+            ''', (signal_id, recipient_id))
+    
+    def finish_signal(self, signal_id):
+        """Завершение рассылки сигнала"""
+        with self._connect() as conn:
+            conn.execute('''
+                UPDATE signals SET status = 'done', finished_at = ? WHERE signal_id = ?
+            ''', (datetime.now().isoformat(), signal_id))
+    
+    def get_running_signals(self):
+        """Рассылки сигналов, прерванные остановкой бота"""
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT signal_id, message_ids FROM signals WHERE status = 'running' ORDER BY signal_id")
+            return [(signal_id, json.loads(message_ids)) for signal_id, message_ids in cursor.fetchall()]
+    
+    def get_signal_report(self, limit=10):
+        """Последние сигналы с числом доставленных и недоставленных сообщений"""
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            
+            cursor.execute('''
+                SELECT s.signal_id, s.message_ids, s.status, s.recipients, s.created_at,
+                       COALESCE(SUM(d.delivered), 0), COUNT(d.recipient_id) - COALESCE(SUM(d.delivered), 0)
+                FROM signals s
+                LEFT JOIN signal_deliveries d ON d.signal_id = s.signal_id
+                WHERE s.signal_id IN (SELECT signal_id FROM signals ORDER BY signal_id DESC LIMIT ?)
+                GROUP BY s.signal_id
+                ORDER BY s.signal_id DESC
+            ''', (limit,))
+            
+            return [
+                {
+                    "signal_id": row[0],
+                    "message_ids": json.loads(row[1]),
+                    "status": row[2],
+                    "recipients": row[3],
+                    "created_at": row[4],
+                    "delivered": row[5],
+                    "failed": row[6]
+                }
+                for row in cursor.fetchall()
+            ]
+    
+    def prune_signal_deliveries(self, days=30):
+        """Удаление журнала доставки завершенных сигналов старше days дней"""
+        cutoff = (datetime.now() - timedelta(days=days)).isoformat()
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                DELETE FROM signal_deliveries WHERE signal_id IN (
+                    SELECT signal_id FROM signals WHERE status = 'done' AND created_at < ?
+                )
+            ''', (cutoff,))
+            return cursor.rowcount
+    
     def get_latest_payments(self, limit=10):
         """Получение последних платежей для отчета"""
-        with sqlite3.connect(self.db_path) as conn:
+        with self._connect() as conn:
             cursor = conn.cursor()
             
             cursor.execute('''
@@ -347,14 +683,15 @@ class Database:
     
     def get_expiring_users(self, date):
         """Получение пользователей, у которых подписка истекает в указанную дату"""
-        with sqlite3.connect(self.db_path) as conn:
+        with self._connect() as conn:
             cursor = conn.cursor()
             
+            day_start, day_end = self._day_bounds(date)
             cursor.execute('''
                 SELECT telegram_id, username, end_date 
                 FROM users 
-                WHERE status = 'active' AND DATE(end_date) = DATE(?)
-            ''', (date.isoformat(),))
+                WHERE status = 'active' AND end_date >= ? AND end_date < ?
+            ''', (day_start, day_end))
             
             results = cursor.fetchall()
             return [
@@ -368,7 +705,7 @@ class Database:
     
     def get_expired_users(self):
         """Получение пользователей с просроченной подпиской"""
-        with sqlite3.connect(self.db_path) as conn:
+        with self._connect() as conn:
             cursor = conn.cursor()
             
             cursor.execute('''
@@ -386,9 +723,57 @@ class Database:
                 for row in results
             ]
     
+    def expire_users(self, now=None):
+        """Перевод всех просроченных активных подписок в expired одной транзакцией
+
+        Возвращает список переведенных пользователей.
+        """
+        now = now or datetime.now()
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            
+            cursor.execute('''
+                UPDATE users 
+                SET status = 'expired'
+                WHERE status = 'active' AND end_date < ?
+                RETURNING telegram_id, username
+            ''', (now.isoformat(),))
+            
+            results = cursor.fetchall()
+            conn.commit()
+            self._notify_status([(row[0], 'expired', None) for row in results])
+            return [
+                {
+                    'telegram_id': row[0],
+                    'username': row[1]
+                }
+                for row in results
+            ]
+    
+    def get_scheduled_subscriptions(self):
+        """Сроки активных подписок для планировщика: (telegram_id, end_date, reminded_end_date)"""
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            
+            cursor.execute('''
+                SELECT telegram_id, end_date, reminded_end_date
+                FROM users 
+                WHERE status = 'active' AND end_date IS NOT NULL
+            ''')
+            return cursor.fetchall()
+    
+    def mark_reminded(self, reminders):
+        """Отметка отправленных напоминаний: список (end_date, telegram_id)"""
+        with self._connect() as conn:
+            conn.executemany('''
+                UPDATE users SET reminded_end_date = ?
+                WHERE telegram_id = ?
+            ''', reminders)
+            conn.commit()
+    
     def get_database_stats(self):
         """Получение общей статистики базы данных"""
-        with sqlite3.connect(self.db_path) as conn:
+        with self._connect() as conn:
             cursor = conn.cursor()
             
             # Статистика пользователей
@@ -411,7 +796,7 @@ class Database:
             total_payments = cursor.fetchone()[0]
             
             # Активные подписки
-            cursor.execute('SELECT COUNT(*) FROM users WHERE status = "active"')
+            cursor.execute("SELECT COUNT(*) FROM users WHERE status = 'active'")
             active_users = cursor.fetchone()[0]
             
             return {
@@ -425,7 +810,7 @@ class Database:
     
     def get_users_for_admin(self, limit=20):
         """Получение пользователей для админ-панели"""
-        with sqlite3.connect(self.db_path) as conn:
+        with self._connect() as conn:
             cursor = conn.cursor()
             
             cursor.execute('''
@@ -437,33 +822,33 @@ class Database:
     
     def get_daily_stats(self):
         """Получение статистики за сегодня"""
-        with sqlite3.connect(self.db_path) as conn:
+        with self._connect() as conn:
             cursor = conn.cursor()
-            today = datetime.now().strftime('%Y-%m-%d')
+            day_start, day_end = self._day_bounds(datetime.now())
             
             # Новые пользователи за сегодня
             cursor.execute('''
                 SELECT COUNT(*) FROM users 
-                WHERE DATE(joined_at) = DATE(?)
-            ''', (today,))
+                WHERE joined_at >= ? AND joined_at < ?
+            ''', (day_start, day_end))
             new_users = cursor.fetchone()[0]
             
             # Новые платежи за сегодня
             cursor.execute('''
                 SELECT COUNT(*) FROM payments 
-                WHERE DATE(created_at) = DATE(?)
-            ''', (today,))
+                WHERE created_at >= ? AND created_at < ?
+            ''', (day_start, day_end))
             new_payments = cursor.fetchone()[0]
             
             # Истекшие подписки за сегодня
             cursor.execute('''
                 SELECT COUNT(*) FROM users 
-                WHERE status = "expired" AND DATE(end_date) = DATE(?)
-            ''', (today,))
+                WHERE status = 'expired' AND end_date >= ? AND end_date < ?
+            ''', (day_start, day_end))
             expired_users = cursor.fetchone()[0]
             
             # Активные подписки
-            cursor.execute('SELECT COUNT(*) FROM users WHERE status = "active"')
+            cursor.execute("SELECT COUNT(*) FROM users WHERE status = 'active'")
             active_users = cursor.fetchone()[0]
             
             return {
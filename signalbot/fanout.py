@@ -0,0 +1,71 @@
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+# Результат send_fn: отправка пропущена (уже выполнена раньше), не считается ни доставкой, ни ошибкой
+SKIPPED = "skipped"
+
+
+class FanoutEngine:
+    """Параллельная доставка поста всем получателям через пул потоков
+
+    Темп отправки ограничивает общий RateLimiter в транспорте, поэтому
+    движок не делает собственных пауз между сообщениями.
+    """
+
+    def __init__(self, workers=16):
+        """Создание пула из workers потоков"""
+        self.workers = workers
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="fanout")
+        self.last_report = None
+
+    def _deliver_to(self, recipient, payloads, send_fn, started):
+        # Сообщения одной рассылки уходят получателю последовательно, сохраняя порядок
+        delivered = 0
+        skipped = 0
+        for payload in payloads:
+            try:
+                result = send_fn(recipient, payload)
+                if result is SKIPPED:
+                    skipped += 1
+                elif result:
+                    delivered += 1
+            except Exception as e:
+                print(f"[ERROR] Рассылка {payload} -> {recipient}: {e}")
+        return delivered, skipped, time.monotonic() - started
+
+    def deliver(self, recipients, payloads, send_fn):
+        """Доставка payloads всем recipients; send_fn(recipient, payload) -> bool или SKIPPED"""
+        started = time.monotonic()
+        futures = [
+            self.executor.submit(self._deliver_to, recipient, payloads, send_fn, started)
+            for recipient in recipients
+        ]
+        wait(futures)
+
+        delivered = 0
+        skipped = 0
+        failed = 0
+        last_delivery = 0.0
+        for future in futures:
+            count, skipped_count, finished_at = future.result()
+            delivered += count
+            skipped += skipped_count
+            failed += len(payloads) - count - skipped_count
+            if count:
+                last_delivery = max(last_delivery, finished_at)
+
+        report = {
+            "payloads": len(payloads),
+            "recipients": len(recipients),
+            "delivered": delivered,
+            "skipped": skipped,
+            "failed": failed,
+            "last_delivery": last_delivery,
+            "duration": time.monotonic() - started
+        }
+        self.last_report = report
+        return report
+
+    def shutdown(self):
+        """Остановка пула потоков"""
+        self.executor.shutdown(wait=False)
@@ -0,0 +1,106 @@
+"""Готовые клавиатуры бота
+
+Статические клавиатуры собираются и сериализуются в JSON один раз при
+импорте. send_message передает их как RawJSON, и транспорт вставляет их в
+тело запроса без повторного кодирования. Клавиатуры, зависящие от данных
+(списки пользователей, карточка пользователя), строятся в обработчиках
+через inline_keyboard — других сборщиков клавиатур в боте нет.
+"""
+
+import json
+
+from config import TRIBUTE_LINK
+from transport import RawJSON
+
+
+def reply_keyboard(buttons):
+    """Reply Keyboard (кнопки под строкой ввода)"""
+    return {"keyboard": [list(row) for row in buttons], "resize_keyboard": True, "one_time_keyboard": False}
+
+
+def inline_keyboard(buttons):
+    """Inline-клавиатура из строк кнопок {"text", "callback_data"}"""
+    return {
+        "inline_keyboard": [
+            [{"text": button["text"], "callback_data": button["callback_data"]} for button in row]
+            for row in buttons
+        ]
+    }
+
+
+def freeze(markup):
+    """Сериализация клавиатуры один раз"""
+    return RawJSON(json.dumps(markup, ensure_ascii=False, separators=(",", ":")))
+
+
+MAIN_MENU = freeze(reply_keyboard([
+    ["📈 Получать сигналы"],
+    ["💰 Оплата"],
+    ["ℹ️ Мой статус"],
+    ["🧾 Поддержка", "🆘 Помощь"]
+]))
+
+# Главное меню после отправки скриншота (сигналы и оплата в одном ряду)
+MAIN_MENU_COMPACT = freeze(reply_keyboard([
+    ["📈 Получать сигналы", "💰 Оплата"],
+    ["ℹ️ Мой статус"],
+    ["🧾 Поддержка", "🆘 Помощь"]
+]))
+
+BACK = freeze(reply_keyboard([["↩️ Назад"]]))
+
+SIGNAL_INTRO = freeze(reply_keyboard([
+    ["💰 Оплата"],
+    ["🧾 Поддержка", "🆘 Помощь"]
+]))
+
+HELP = freeze(reply_keyboard([
+    ["🧾 Поддержка"],
+    ["↩️ Назад"]
+]))
+
+SUPPORT = freeze(reply_keyboard([
+    ["🆘 Помощь"],
+    ["↩️ Назад"]
+]))
+
+PAYMENT_PLANS = freeze(reply_keyboard([
+    ["1 месяц — 39 USDT"],
+    ["3 месяца — 99 USDT"],
+    ["Пожизненно — 239 USDT"],
+    ["↩️ Назад"]
+]))
+
+PAYMENT_METHODS = freeze(reply_keyboard([
+    ["💰 Оплатить криптой (TRC20)"],
+    ["⚡ Оплатить через Tribute"],
+    ["↩️ Назад"]
+]))
+
+SEND_SCREENSHOT = freeze(reply_keyboard([
+    ["📸 Отправить скрин"],
+    ["↩️ Назад"]
+]))
+
+STATUS_PAY = freeze(reply_keyboard([
+    ["💰 Оплата"],
+    ["↩️ Назад"]
+]))
+
+ADMIN_PANEL = freeze(inline_keyboard([
+    [{"text": "👥 Пользователи", "callback_data": "admin_users"}, {"text": "💰 Платежи", "callback_data": "admin_payments"}],
+    [{"text": "📊 Статистика", "callback_data": "admin_stats"}, {"text": "📢 Рассылка", "callback_data": "admin_broadcast"}],
+    [{"text": "🔍 Поиск пользователя", "callback_data": "admin_search"}, {"text": "⚡ Быстрые действия", "callback_data": "admin_quick"}],
+    [{"text": "📈 Аналитика", "callback_data": "admin_analytics"}, {"text": "⚙️ Настройки", "callback_data": "admin_settings"}]
+]))
+
+ADMIN_QUICK_ACTIONS = freeze(inline_keyboard([
+    [{"text": "✅ Подтвердить все pending", "callback_data": "quick_confirm_all"}],
+    [{"text": "📊 Статистика за сегодня", "callback_data": "quick_today_stats"}],
+    [{"text": "🔄 Обновить статусы", "callback_data": "quick_update_statuses"}],
+    [{"text": "📤 Тестовое сообщение", "callback_data": "quick_test_message"}],
+    [{"text": "↩️ Назад в панель", "callback_data": "back_admin_panel"}]
+]))
+
+# Кнопка-ссылка на mini app Tribute (inline_keyboard собирает только кнопки с callback_data)
+TRIBUTE = freeze({"inline_keyboard": [[{"text": "💸 Открыть Tribute", "url": TRIBUTE_LINK}]]})
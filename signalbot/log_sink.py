@@ -0,0 +1,127 @@
+import queue
+import threading
+import time
+from collections import OrderedDict
+
+# Максимальная длина сообщения Telegram
+MAX_MESSAGE_LENGTH = 4096
+
+
+class LogSink:
+    """Фоновая отправка логов в канал
+
+    send_log только кладет строку в ограниченную очередь и сразу возвращает
+    управление. Фоновый поток раз в flush_interval секунд (или при накоплении
+    сообщения на 4096 символов) склеивает строки в одно сообщение, схлопывая
+    повторы. При переполнении очереди строки отбрасываются и учитываются.
+    """
+
+    _STOP = object()
+
+    def __init__(self, send_fn, max_queue=1000, flush_interval=3.0):
+        self.send_fn = send_fn
+        self.flush_interval = flush_interval
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.dropped = 0
+        self.sent_messages = 0
+        self._lock = threading.Lock()
+        self._closing = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="log-sink", daemon=True)
+        self._thread.start()
+
+    def emit(self, timestamp, text):
+        """Поставить строку лога в очередь, не блокируя вызывающий поток"""
+        try:
+            self.queue.put_nowait((timestamp, text))
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+
+    def close(self, timeout=5):
+        """Отправить накопленное и остановить поток
+
+        Если очередь переполнена и метка остановки не помещается, поток сам
+        дочитывает очередь до конца после _closing, поэтому хвост лога не теряется.
+        """
+        self._closing.set()
+        try:
+            self.queue.put(self._STOP, timeout=timeout)
+        except queue.Full:
+            pass
+        self._thread.join(timeout)
+
+    def _run(self):
+        pending = OrderedDict()
+        size = 0
+        deadline = None
+        while True:
+            timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+            if self._closing.is_set():
+                # При остановке не ждем окна склейки: дочитываем очередь и выходим
+                timeout = 0.0
+            try:
+                item = self.queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+
+            if item is self._STOP or (item is None and self._closing.is_set()):
+                self._flush(pending)
+                return
+
+            if item is not None:
+                timestamp, text = item
+                # Одинаковые строки в одной пачке схлопываются в одну со счетчиком
+                entry = pending.get(text)
+                if entry:
+                    entry[1] += 1
+                else:
+                    pending[text] = [timestamp, 1]
+                    size += len(text) + len(timestamp) + 4
+                if deadline is None:
+                    deadline = time.monotonic() + self.flush_interval
+
+            if pending and (size >= MAX_MESSAGE_LENGTH or time.monotonic() >= deadline):
+                self._flush(pending)
+                pending = OrderedDict()
+                size = 0
+                deadline = None
+
+    def _render(self, pending):
+        with self._lock:
+            dropped, self.dropped = self.dropped, 0
+
+        lines = []
+        for text, (timestamp, count) in pending.items():
+            line = f"[{timestamp}] {text}"
+            if count > 1:
+                line += f" (×{count})"
+            lines.append(line[:MAX_MESSAGE_LENGTH])
+        if dropped:
+            lines.append(f"[LOG] Пропущено {dropped} строк: переполнение очереди логов")
+        return lines
+
+    def _flush(self, pending):
+        if not pending and not self.dropped:
+            return
+
+        # Режем на сообщения не длиннее лимита Telegram по границам строк
+        chunks = []
+        current = ""
+        for line in self._render(pending):
+            if current and len(current) + 1 + len(line) > MAX_MESSAGE_LENGTH:
+                chunks.append(current)
+                current = line
+            else:
+                current = f"{current}\n{line}" if current else line
+        if current:
+            chunks.append(current)
+
+        for chunk in chunks:
+            try:
+                if self.send_fn(chunk):
+                    with self._lock:
+                        self.sent_messages += 1
+                    continue
+            except Exception as e:
+                print(f"[ERROR] Логирование: {e}")
+            print(f"Не удалось отправить лог в канал: {chunk}")
@@ -6,6 +6,7 @@ import time
 import json
 import threading
 import os
+import sys
 from datetime import datetime, timedelta
 from pathlib import Path
 from config import *
@@ -33,15 +34,45 @@ STATUS_MESSAGES = {
 }
 
 from db import Database
+from transport import TelegramTransport, RateLimited, unreachable_reason
+from fanout import FanoutEngine, SKIPPED
+from ratelimit import RateLimiter
+from media import MediaRegistry
+from log_sink import LogSink
+from pipeline import UpdatePipeline
+from router import Router, Request, STATE
+from scheduler import ExpiryScheduler
+from recipients import RecipientSet
+from signals import SignalIngestor
+import keyboards
+from outbox import (
+    Outbox, PRIORITY_SIGNAL, PRIORITY_PAYMENT, PRIORITY_BROADCAST, PRIORITY_LOG,
+    DELIVERED, RETRY, FAILED, DEFERRED
+)
 
 class SignalBot:
     def __init__(self):
         """Инициализация бота"""
         self.token = TOKEN
-        self.base_url = f"https://api.telegram.org/bot{self.token}"
-        self.db = Database()
-        self.last_message_id = None
+        self.base_url = f"{API_BASE_URL}/bot{self.token}"
+        self.limiter = RateLimiter(RATE_LIMIT_GLOBAL, RATE_LIMIT_PER_CHAT, RATE_LIMIT_PER_GROUP)
+        self.transport = TelegramTransport(self.base_url, HTTP_POOL_SIZE, self.limiter, RATE_LIMIT_MAX_RETRIES)
+        self.db = Database(state_cache_size=STATE_CACHE_SIZE, state_cache_ttl=STATE_CACHE_TTL)
+        self.fanout = FanoutEngine(FANOUT_WORKERS)
+        self.media = MediaRegistry(self.db)
+        self.recipients = RecipientSet(self.db, RECIPIENT_RECONCILE_INTERVAL)
+        self.recipients.start()
+        self.outbox = Outbox(self.db, self.deliver_outbound, OUTBOX_WORKERS, OUTBOX_MAX_ATTEMPTS)
+        self.outbox.start()
+        self.log_sink = LogSink(self.deliver_log, LOG_QUEUE_SIZE, LOG_FLUSH_INTERVAL)
+        self.unreachable_ids = set()
+        self.signals = SignalIngestor(self.db, SIGNAL_CHANNEL_ID, self.deliver_signal, SIGNAL_ALBUM_WINDOW)
+        self.signals.start()
         self.running = False
+        self.pipeline = None
+        self.update_executor = None
+        self.router = self.build_router()
+        self.scheduler = ExpiryScheduler(self.db, self.expire_subscriptions, self.send_expiry_reminders)
         self.last_backup_date = None
         
         # Запускаем логирование старта
@@ -56,11 +87,15 @@ class SignalBot:
                 return None
         return None
     
-    def send_request(self, method, params=None):
+    def send_request(self, method, params=None, log_errors=True, timeout=30):
         """Отправка запроса к Telegram API с обработкой ошибок"""
         try:
-            url = f"{self.base_url}/{method}"
-            response = requests.post(url, json=params, timeout=30)
+            response = self.transport.post(method, json=params, timeout=timeout)
+            
+            # Заблокировавшие бота и удаленные аккаунты исключаются из рассылок без записи в лог
+            reason = unreachable_reason(response, method)
+            if reason and params and self.mark_unreachable(params.get("chat_id"), reason):
+                return None
             
             # Обработка HTTP ошибок (игнорируем timeout и 409)
             if response.status_code == 400:
@@ -69,14 +104,18 @@ class SignalBot:
                     return None
                 error_msg = f"[ERROR] Bad Request 400: {response.text}"
                 print(error_msg)
-                self.send_log(error_msg)
+                if log_errors:
+                    self.send_log(error_msg)
                 return None
             elif response.status_code == 409:
                 # Игнорируем 409 конфликты
                 return None
             elif response.status_code == 429:
-                # Rate limit - небольшая задержка
-                time.sleep(1)
+                # Транспорт уже выждал retry_after и исчерпал повторы
+                error_msg = f"[ERROR] Rate limit 429 в {method}: повторы исчерпаны"
+                print(error_msg)
+                if log_errors:
+                    self.send_log(error_msg)
                 return None
             
             response.raise_for_status()
@@ -90,18 +129,20 @@ class SignalBot:
             if "no such column" not in str(e).lower():
                 error_msg = f"[ERROR] API запрос {method}: {e}"
                 print(error_msg)
-                self.send_log(error_msg)
+                if log_errors:
+                    self.send_log(error_msg)
             return None
         except Exception as e:
             # Игнорируем некоторые ошибки, логируем только важные
             if "timeout" not in str(e).lower() and "no such column" not in str(e).lower():
                 error_msg = f"[ERROR] Неожиданная ошибка в {method}: {e}"
                 print(error_msg)
-                self.send_log(error_msg)
+                if log_errors:
+                    self.send_log(error_msg)
             return None
     
-    def send_message(self, chat_id, text, reply_markup=None, parse_mode="HTML"):
-        """Отправка безопасного сообщения пользователю"""
+    def send_message(self, chat_id, text, reply_markup=None, parse_mode="HTML", priority=None):
+        """Отправка безопасного сообщения пользователю (с priority — через очередь исходящих)"""
         try:
             if not chat_id or not isinstance(chat_id, (int, str)):
                 self.send_log(f"[WARN] Пропущена отправка — неверный chat_id: {chat_id}")
@@ -115,10 +156,16 @@ class SignalBot:
             if reply_markup:
                 params["reply_markup"] = reply_markup
 
+            if priority is not None:
+                self.outbox.enqueue("sendMessage", params, priority)
+                return True
+
             response = self.send_request("sendMessage", params)
             if not response or not response.get("ok"):
-                desc = response.get("description", "unknown error") if response else "no response"
-                self.send_log(f"[WARN] Не удалось отправить сообщение ({chat_id}): {desc}")
+                # О недоступных пользователях уже сообщено один раз при отметке
+                if chat_id not in self.unreachable_ids:
+                    desc = response.get("description", "unknown error") if response else "no response"
+                    self.send_log(f"[WARN] Не удалось отправить сообщение ({chat_id}): {desc}")
                 return False
 
             return True
@@ -130,7 +177,7 @@ class SignalBot:
                 self.send_log(error_msg)
             return False
     
-    def send_media_group(self, chat_id, media):
+    def send_media_group(self, chat_id, media, priority=None):
         """Отправка альбома (нескольких фото)"""
         try:
             params = {
@@ -138,6 +185,10 @@ class SignalBot:
                 "media": json.dumps(media)
             }
             
+            if priority is not None:
+                self.outbox.enqueue("sendMediaGroup", params, priority)
+                return True
+            
             result = self.send_request("sendMediaGroup", params)
             return result is not None and result.get("ok", False)
         except Exception as e:
@@ -146,7 +197,7 @@ class SignalBot:
             self.send_log(error_msg)
             return False
     
-    def send_photo(self, chat_id, photo_path, caption=None, parse_mode="HTML"):
+    def send_photo(self, chat_id, photo_path, caption=None, parse_mode="HTML", priority=None):
         """Безопасная отправка фото"""
         try:
             if not chat_id or not isinstance(chat_id, (int, str)):
@@ -157,19 +208,54 @@ class SignalBot:
                 self.send_log(f"[ERROR] Файл не найден: {photo_path}")
                 return False
 
+            if priority is not None:
+                # В очереди хранится путь: файл (или его file_id) берется в момент отправки
+                self.outbox.enqueue("sendPhoto", {
+                    "chat_id": chat_id,
+                    "photo_path": photo_path,
+                    "caption": caption,
+                    "parse_mode": parse_mode
+                }, priority)
+                return True
+
+            # Уже загруженный файл отправляем по file_id, без повторной загрузки
+            file_id = self.media.get_file_id(photo_path)
+            if file_id:
+                response = self.transport.post(
+                    "sendPhoto",
+                    json={"chat_id": chat_id, "photo": file_id, "caption": caption or "", "parse_mode": parse_mode},
+                    timeout=20
+                )
+                if response.ok:
+                    return True
+                if not self.is_file_id_error(response):
+                    reason = unreachable_reason(response)
+                    if reason:
+                        if not self.mark_unreachable(chat_id, reason):
+                            self.send_log(f"[WARN] Не удалось отправить фото — {reason} (chat_id={chat_id})")
+                        return False
+                    response.raise_for_status()
+                # Telegram больше не принимает file_id — загрузим файл заново
+                self.media.forget(photo_path)
+
             with open(photo_path, "rb") as photo_file:
-                response = requests.post(
-                    f"{self.base_url}/sendPhoto",
+                response = self.transport.post(
+                    "sendPhoto",
                     data={"chat_id": chat_id, "caption": caption or "", "parse_mode": parse_mode},
                     files={"photo": photo_file},
                     timeout=20
                 )
 
-            if response.status_code == 400 and "chat not found" in response.text:
-                self.send_log(f"[WARN] Не удалось отправить фото — chat not found (chat_id={chat_id})")
+            reason = unreachable_reason(response)
+            if reason:
+                if not self.mark_unreachable(chat_id, reason):
+                    self.send_log(f"[WARN] Не удалось отправить фото — {reason} (chat_id={chat_id})")
                 return False
 
             response.raise_for_status()
+            photos = response.json().get("result", {}).get("photo")
+            if photos:
+                self.media.remember(photo_path, photos[-1]["file_id"])
             return True
 
         except Exception as e:
@@ -179,6 +265,53 @@ class SignalBot:
                 self.send_log(error_msg)
             return False
     
+    @staticmethod
+    def is_file_id_error(response):
+        """Telegram отклонил file_id (файл удален или идентификатор устарел)"""
+        return response.status_code == 400 and "file" in response.text.lower()
+    
+    def send_local_album(self, chat_id, photo_paths):
+        """Отправка альбома из локальных фото: по file_id, а при первой отправке — загрузкой"""
+        file_ids = [self.media.get_file_id(path) for path in photo_paths]
+        if all(file_ids):
+            response = self.transport.post(
+                "sendMediaGroup",
+                json={"chat_id": chat_id, "media": [{"type": "photo", "media": file_id} for file_id in file_ids]},
+                timeout=30
+            )
+            if response.ok or not self.is_file_id_error(response):
+                return response.ok
+            for path in photo_paths:
+                self.media.forget(path)
+        
+        media = [
+            {"type": "photo", "media": f"attach://photo{index}"}
+            for index in range(len(photo_paths))
+        ]
+        files = {}
+        try:
+            for index, path in enumerate(photo_paths):
+                files[f"photo{index}"] = open(path, "rb")
+            response = self.transport.post(
+                "sendMediaGroup",
+                data={"chat_id": chat_id, "media": json.dumps(media)},
+                files=files,
+                timeout=30
+            )
+        finally:
+            for file in files.values():
+                file.close()
+        
+        if not response.ok:
+            return False
+        
+        # Запоминаем file_id загруженных фото для следующих отправок
+        for path, message in zip(photo_paths, response.json().get("result", [])):
+            photos = message.get("photo")
+            if photos:
+                self.media.remember(path, photos[-1]["file_id"])
+        return True
+    
     def send_signal_intro(self, chat_id, intro_text):
         """Отправка введения с примером сигнала"""
         try:
@@ -192,10 +325,7 @@ class SignalBot:
                 self.send_signal_examples(chat_id)
             
             # Добавляем кнопки после введения
-            keyboard = self.create_reply_keyboard([
-                ["💰 Оплата"],
-                ["🧾 Поддержка", "🆘 Помощь"]
-            ])
+            keyboard = keyboards.SIGNAL_INTRO
             self.send_message(chat_id, "💡 Выберите действие для продолжения:", keyboard)
                 
         except Exception as e:
@@ -259,7 +389,7 @@ class SignalBot:
             print(error_msg)
             self.send_log(error_msg)
     
-    def forward_message(self, from_chat_id, to_chat_id, message_id):
+    def forward_message(self, from_chat_id, to_chat_id, message_id, priority=None):
         """Пересылка сообщения"""
         try:
             params = {
@@ -268,6 +398,10 @@ class SignalBot:
                 "message_id": message_id
             }
             
+            if priority is not None:
+                self.outbox.enqueue("forwardMessage", params, priority)
+                return True
+            
             result = self.send_request("forwardMessage", params)
             return result is not None and result.get("ok", False)
         except Exception as e:
@@ -275,6 +409,26 @@ class SignalBot:
             print(error_msg)
             return False
     
+    def forward_messages(self, from_chat_id, to_chat_id, message_ids, priority=None):
+        """Пересылка нескольких сообщений одним запросом (альбом остается альбомом)"""
+        try:
+            params = {
+                "chat_id": to_chat_id,
+                "from_chat_id": from_chat_id,
+                "message_ids": message_ids
+            }
+            
+            if priority is not None:
+                self.outbox.enqueue("forwardMessages", params, priority)
+                return True
+            
+            result = self.send_request("forwardMessages", params)
+            return result is not None and result.get("ok", False)
+        except Exception as e:
+            error_msg = f"[ERROR] Пересылка сообщений {message_ids} в {to_chat_id}: {e}"
+            print(error_msg)
+            return False
+    
     def get_updates(self, offset=None, timeout=30):
         """Получение обновлений от Telegram"""
         try:
@@ -282,7 +436,9 @@ class SignalBot:
             if offset:
                 params["offset"] = offset
             
-            result = self.send_request("getUpdates", params)
+            # HTTP-таймаут должен быть больше long polling, иначе пустой ответ
+            # Telegram обрывается как ошибка
+            result = self.send_request("getUpdates", params, timeout=timeout + 10)
             if result and result.get("ok"):
                 return result.get("result", [])
             return []
@@ -293,68 +449,86 @@ class SignalBot:
             return []
     
     def send_log(self, text):
-        """Отправка лога в канал"""
+        """Отправка лога в канал (через фоновую очередь, не блокирует обработчик)"""
         try:
             timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            log_message = f"[{timestamp}] {text}"
-            
-            # Пытаемся отправить в канал
-            success = self.send_message(LOG_CHANNEL_ID, log_message)
-            
-            if not success:
-                print(f"Не удалось отправить лог в канал: {log_message}")
+            self.log_sink.emit(timestamp, text)
             
         except Exception as e:
             error_msg = f"[ERROR] Логирование: {e}"
             print(error_msg)
     
-    def send_file_log(self, file_id, username, user_id):
-        """Отправка фото напрямую в лог-канал"""
+    def deliver_log(self, text):
+        """Постановка пачки логов в очередь исходящих с низшим приоритетом"""
+        self.outbox.enqueue("sendMessage", {"chat_id": LOG_CHANNEL_ID, "text": text}, PRIORITY_LOG)
+        return True
+    
+    def deliver_outbound(self, method, params):
+        """Доставка запроса из очереди исходящих; ошибки не логируются в канал, чтобы не зациклиться"""
+        if method == "sendPhoto" and "photo_path" in params:
+            if self.send_photo(params["chat_id"], params["photo_path"], params.get("caption"), params.get("parse_mode", "HTML")):
+                return DELIVERED, None
+            if params["chat_id"] in self.unreachable_ids:
+                return FAILED, "sendPhoto: получатель недоступен"
+            return RETRY, "sendPhoto: не удалось отправить фото"
+        
         try:
-            self.send_request("sendPhoto", {
-                "chat_id": LOG_CHANNEL_ID,
-                "photo": file_id,
-                "caption": f"[SCREENSHOT]\nUser: @{username or 'unknown'} (ID {user_id})"
-            })
-        except Exception as e:
-            print(f"[ERROR] send_file_log: {e}")
+            response = self.transport.post(method, json=params, timeout=30, block=False)
+        except RateLimited as e:
+            return DEFERRED, e.retry_after
+        except requests.exceptions.RequestException as e:
+            return RETRY, str(e)
+        
+        if response.ok:
+            return DELIVERED, None
+        reason = unreachable_reason(response, method)
+        if reason:
+            self.mark_unreachable(params.get("chat_id"), reason)
+        # Ошибки запроса и запрет доступа повтором не исправить
+        if response.status_code in (400, 403):
+            return FAILED, response.text[:500]
+        return RETRY, f"HTTP {response.status_code}: {response.text[:500]}"
     
-    def create_reply_keyboard(self, buttons):
-        """Создание Reply Keyboard (кнопки под строкой ввода)"""
+    def mark_unreachable(self, chat_id, reason):
+        """Исключение пользователя из рассылок после ответа «бот заблокирован» и т.п.
+
+        Возвращает True, если chat_id — личный чат пользователя (каналы и группы
+        с отрицательными ID не отмечаются: «chat not found» для них — ошибка настройки).
+        """
+        if not isinstance(chat_id, int) or chat_id <= 0:
+            return False
+        self.unreachable_ids.add(chat_id)
         try:
-            keyboard = []
-            for row in buttons:
-                keyboard_row = []
-                for button in row:
-                    keyboard_row.append(button)
-                keyboard.append(keyboard_row)
-            
-            return {"keyboard": keyboard, "resize_keyboard": True, "one_time_keyboard": False}
+            self.recipients.discard(chat_id)
+            if self.db.mark_unreachable(chat_id, reason):
+                self.send_log(f"[UNREACHABLE] ID {chat_id}: {reason}, исключен из рассылок")
         except Exception as e:
-            error_msg = f"[ERROR] Создание клавиатуры: {e}"
-            print(error_msg)
-            self.send_log(error_msg)
-            return None
+            print(f"[ERROR] Отметка недоступного пользователя {chat_id}: {e}")
+        return True
     
-    def create_inline_keyboard(self, buttons):
-        """Создание inline клавиатуры"""
+    def broadcast(self, user_ids, text):
+        """Постановка рассылки в очередь исходящих; возвращает число получателей"""
+        self.outbox.enqueue_many(
+            "sendMessage",
+            [{"chat_id": user_id, "text": text, "parse_mode": "HTML"} for user_id in user_ids],
+            PRIORITY_BROADCAST
+        )
+        return len(user_ids)
+    
+    def send_file_log(self, file_id, username, user_id):
+        """Отправка фото в лог-канал через очередь исходящих
+
+        У канала лимит 20 сообщений в минуту: прямая отправка из обработчика
+        скриншота занимала бы поток обработчика до освобождения лимита.
+        """
         try:
-            keyboard = []
-            for row in buttons:
-                keyboard_row = []
-                for button in row:
-                    keyboard_row.append({
-                        "text": button["text"],
-                        "callback_data": button["callback_data"]
-                    })
-                keyboard.append(keyboard_row)
-            
-            return {"inline_keyboard": keyboard}
+            self.outbox.enqueue("sendPhoto", {
+                "chat_id": LOG_CHANNEL_ID,
+                "photo": file_id,
+                "caption": f"[SCREENSHOT]\nUser: @{username or 'unknown'} (ID {user_id})"
+            }, PRIORITY_LOG)
         except Exception as e:
-            error_msg = f"[ERROR] Создание inline клавиатуры: {e}"
-            print(error_msg)
-            self.send_log(error_msg)
-            return None
+            print(f"[ERROR] send_file_log: {e}")
     
     def handle_start(self, chat_id, user_id, username):
         """Обработка команды /start"""
@@ -363,14 +537,14 @@ class SignalBot:
             if not self.db.user_exists(user_id):
                 self.db.add_user(user_id, username)
                 self.send_log(f"[NEW USER] @{username} (ID: {user_id})")
+            
+            # /start от заблокировавшего бота означает, что он снова доступен
+            self.unreachable_ids.discard(user_id)
+            if self.db.clear_unreachable(user_id):
+                self.send_log(f"[REACHABLE] ID {user_id}: снова получает рассылки")
 
             # Главное меню с постоянной кнопкой "Помощь"
-            keyboard = self.create_reply_keyboard([
-                ["📈 Получать сигналы"],
-                ["💰 Оплата"],
-                ["ℹ️ Мой статус"],
-                ["🧾 Поддержка", "🆘 Помощь"]
-            ])
+            keyboard = keyboards.MAIN_MENU
 
             welcome_text = (
                 "Добро пожаловать в PTT Trades!\n\n"
@@ -410,7 +584,7 @@ class SignalBot:
                 "Присоединяйся к нашему сообществу и начни торговать осознанно."
             )
 
-            keyboard = self.create_reply_keyboard([["↩️ Назад"]])
+            keyboard = keyboards.BACK
 
             if not os.path.exists(photo1_path) or not os.path.exists(photo2_path):
                 missing = []
@@ -421,24 +595,8 @@ class SignalBot:
                 self.send_message(chat_id, f"Не найдены изображения: {', '.join(missing)}", keyboard)
                 return
 
-            # Формируем альбом из двух фото
-            files = {
-                "photo1": open(photo1_path, "rb"),
-                "photo2": open(photo2_path, "rb")
-            }
-
-            media = [
-                {"type": "photo", "media": "attach://photo1"},
-                {"type": "photo", "media": "attach://photo2"}
-            ]
-
-            # Отправляем альбом
-            requests.post(
-                f"{self.base_url}/sendMediaGroup",
-                data={"chat_id": chat_id, "media": json.dumps(media)},
-                files=files,
-                timeout=30
-            )
+            # Отправляем альбом из двух фото (после первой загрузки — по file_id)
+            self.send_local_album(chat_id, [photo1_path, photo2_path])
 
             # Отправляем описание
             self.send_message(chat_id, caption_text, keyboard)
@@ -472,10 +630,7 @@ class SignalBot:
 📞 <b>Если остались вопросы</b> — напиши администратору:
 👉 <a href="https://t.me/PTTmanager">@PTTmanager</a>
 """
-            keyboard = self.create_reply_keyboard([
-                ["🧾 Поддержка"],
-                ["↩️ Назад"]
-            ])
+            keyboard = keyboards.HELP
             self.send_message(chat_id, help_text, reply_markup=keyboard, parse_mode="HTML")
 
         except Exception as e:
@@ -488,12 +643,7 @@ class SignalBot:
         try:
             payment_text = "Выберите подходящий тариф:"
             
-            keyboard = self.create_reply_keyboard([
-                ["1 месяц — 39 USDT"],
-                ["3 месяца — 99 USDT"],
-                ["Пожизненно — 239 USDT"],
-                ["↩️ Назад"]
-            ])
+            keyboard = keyboards.PAYMENT_PLANS
             self.send_message(chat_id, payment_text, keyboard)
             
             # Устанавливаем состояние для кнопки "Назад"
@@ -516,11 +666,7 @@ class SignalBot:
             payment_text = "Выберите способ оплаты:"
             
             # Создаем Reply Keyboard кнопки для выбора метода оплаты
-            keyboard = self.create_reply_keyboard([
-                ["💰 Оплатить криптой (TRC20)"],
-                ["⚡ Оплатить через Tribute"],
-                ["↩️ Назад"]
-            ])
+            keyboard = keyboards.PAYMENT_METHODS
             
             self.send_message(chat_id, payment_text, keyboard)
             
@@ -545,10 +691,7 @@ class SignalBot:
 TRC20: {CRYPTO_ADDRESS}
 После перевода прикрепите скрин перевода."""
             
-            keyboard = self.create_reply_keyboard([
-                ["📸 Отправить скрин"],
-                ["↩️ Назад"]
-            ])
+            keyboard = keyboards.SEND_SCREENSHOT
             self.send_message(chat_id, payment_text, keyboard)
             
             # Устанавливаем состояние ожидания скриншота с информацией о методе оплаты
@@ -571,18 +714,10 @@ TRC20: {CRYPTO_ADDRESS}
             payment_text = """Оплата через Tribute осуществляется в официальном Telegram mini app.
 Нажмите кнопку ниже, чтобы перейти 👇"""
             
-            # Создаем inline кнопку для открытия Tribute
-            keyboard = {
-                "inline_keyboard": [[
-                    {"text": "💸 Открыть Tribute", "url": TRIBUTE_LINK}
-                ]],
-                "resize_keyboard": True
-            }
-            
-            self.send_message(chat_id, payment_text, keyboard)
+            self.send_message(chat_id, payment_text, keyboards.TRIBUTE)
             
             # После оплаты через Tribute пользователь вернется и отправит скрин
-            keyboard_back = self.create_reply_keyboard([["↩️ Назад"]])
+            keyboard_back = keyboards.BACK
             self.send_message(chat_id, "После завершения оплаты в Tribute отправьте скриншот:", keyboard_back)
             
             # Устанавливаем состояние ожидания скриншота с информацией о методе оплаты
@@ -599,7 +734,7 @@ TRC20: {CRYPTO_ADDRESS}
             self.send_message(chat_id, "📸 Отправьте скриншот вашей транзакции.")
             
             # Создаем клавиатуру с кнопкой "Назад"
-            keyboard = self.create_reply_keyboard([["↩️ Назад"]])
+            keyboard = keyboards.BACK
             self.send_message(chat_id, "Нажмите кнопку 'Назад' чтобы вернуться в меню", keyboard)
             
             # Устанавливаем состояние ожидания скриншота
@@ -667,11 +802,7 @@ status: pending"""
             self.db.set_user_state(user_id, None)
             
             # Показываем сообщение о завершении без FAQ
-            keyboard = self.create_reply_keyboard([
-                ["📈 Получать сигналы", "💰 Оплата"],
-                ["ℹ️ Мой статус"],
-                ["🧾 Поддержка", "🆘 Помощь"]
-            ])
+            keyboard = keyboards.MAIN_MENU_COMPACT
             self.send_message(chat_id, "✅ Спасибо! Ваш платёж отправлен на проверку.", keyboard)
             
         except Exception as e:
@@ -767,12 +898,9 @@ status: pending"""
             
             # Добавляем кнопки в зависимости от статуса
             if user and user["status"] in ["expired", "none"]:
-                keyboard = self.create_reply_keyboard([
-                    ["💰 Оплата"],
-                    ["↩️ Назад"]
-                ])
+                keyboard = keyboards.STATUS_PAY
             else:
-                keyboard = self.create_reply_keyboard([["↩️ Назад"]])
+                keyboard = keyboards.BACK
             
             self.send_message(chat_id, "Выберите действие:", keyboard)
         except Exception as e:
@@ -793,10 +921,7 @@ status: pending"""
 
 ⏰ Ответ обычно в течение 1–2 часов.
 """
-            keyboard = self.create_reply_keyboard([
-                ["🆘 Помощь"],
-                ["↩️ Назад"]
-            ])
+            keyboard = keyboards.SUPPORT
             self.send_message(chat_id, support_text, reply_markup=keyboard, parse_mode="HTML")
 
         except Exception as e:
@@ -870,7 +995,7 @@ status: pending"""
                         # Уведомляем пользователя
                         success_message = f"✅ Ваша подписка активирована: {plan_name}. Спасибо, что с нами!"
                         
-                        self.send_message(target_user_id, success_message)
+                        self.send_message(target_user_id, success_message, priority=PRIORITY_PAYMENT)
                         
                         # Логируем подтверждение в новом формате
                         active_until = end_date_str if end_date_str != "бессрочно" else "lifetime"
@@ -912,16 +1037,10 @@ active_until: {active_until}""")
             
             elif command == "broadcast" and args:
                 message = " ".join(args)
-                active_users = self.db.get_active_users()
-                sent_count = 0
-                
-                for user_id in active_users:
-                    if self.send_message(user_id, message):
-                        sent_count += 1
-                    time.sleep(0.1)
+                queued_count = self.broadcast(self.recipients.snapshot(), message)
                 
-                self.send_log(f"[BROADCAST] Message sent to {sent_count} users")
-                self.send_message(chat_id, f"✅ Сообщение отправлено {sent_count} пользователям")
+                self.send_log(f"[BROADCAST] Message queued for {queued_count} users")
+                self.send_message(chat_id, f"✅ Сообщение поставлено в очередь для {queued_count} пользователей")
             
             elif command == "stats":
                 stats = self.db.get_database_stats()
@@ -935,6 +1054,11 @@ active_until: {active_until}""")
                 for status, count in stats['users'].items():
                     message += f"• {status}: {count}\n"
                 
+                cache_stats = self.db.state_cache.get_stats()
+                message += (f"\nКэш состояний: {cache_stats['size']} записей, "
+                            f"попаданий {cache_stats['hit_rate']:.0%} "
+                            f"({cache_stats['hits']}/{cache_stats['hits'] + cache_stats['misses']})\n")
+                
                 self.send_message(chat_id, message)
             
             elif command == "help":
@@ -949,6 +1073,8 @@ active_until: {active_until}""")
 /test_log - тестовое сообщение в лог-канал
 /test_forward - тестовая пересылка сообщения
 /test_db - проверка подключения к базе
+/net_stats - статистика HTTP-соединений
+/signals - доставка последних сигналов
 /help - справка по командам
 
 Примеры:
@@ -968,6 +1094,69 @@ active_until: {active_until}""")
                 else:
                     self.send_message(chat_id, "❌ Ошибка тестовой пересылки")
             
+            elif command == "net_stats":
+                stats = self.transport.get_stats()
+                limiter_stats = self.limiter.get_stats()
+                outbox_stats = self.outbox.get_stats()
+                scheduler_stats = self.scheduler.get_stats()
+                recipients_stats = self.recipients.get_stats()
+                signal_stats = self.signals.get_stats()
+                unreachable = self.db.get_unreachable_stats()
+                unreachable_info = ", ".join(f"{reason}: {count}" for reason, count in sorted(unreachable.items())) or "нет"
+                next_event = scheduler_stats['next_event'].strftime('%d.%m.%Y %H:%M') if scheduler_stats['next_event'] else "нет"
+                pipeline_info = ""
+                if self.update_executor:
+                    shards = self.update_executor.get_stats()["shards"]
+                    pipeline_info += f"\n🧵 Очереди обработчиков: {' / '.join(map(str, shards))}"
+                if self.pipeline:
+                    pipeline_stats = self.pipeline.get_stats()
+                    pipeline_info += (f"\n📥 Обновлений: {pipeline_stats['processed']}/{pipeline_stats['received']}, "
+                                      f"в очереди {pipeline_stats['depth']} (макс. на обработчик {pipeline_stats['max_depth']})\n"
+                                      f"⏱ Обработка: p50 {pipeline_stats['p50_ms']:.0f} мс, "
+                                      f"p99 {pipeline_stats['p99_ms']:.0f} мс\n")
+                message = f"""🌐 HTTP-транспорт:
+
+🔌 Пул соединений: {stats['pool_size']}
+📨 Запросов: {stats['requests']}
+✅ Попаданий в пул: {stats['pool_hits']}
+🆕 Новых соединений: {stats['pool_misses']}
+⏱ Ожиданий лимита: {limiter_stats['waits']}
+🔁 Повторов после 429: {limiter_stats['retries']}
+
+📤 Очередь исходящих: {outbox_stats['pending']} ожидают, {outbox_stats['dead']} недоставлено
+✅ Доставлено из очереди: {outbox_stats['delivered']}, повторов: {outbox_stats['retried']}, отложено по лимиту: {outbox_stats['deferred']}
+⏰ Подписок в планировщике: {scheduler_stats['scheduled']}, ближайшее событие: {next_event}
+👥 Получателей сигналов: {recipients_stats['size']}, расхождений при сверке: {recipients_stats['last_drift']}
+📡 Постов канала: {signal_stats['received']}, переслано {signal_stats['delivered']} (альбомов {signal_stats['albums']}), последний message_id: {signal_stats['last_message_id']}
+🚫 Недоступных получателей: {sum(unreachable.values())} ({unreachable_info})
+{pipeline_info}
+
+Задержки по методам:
+"""
+                for method, method_stats in sorted(stats['methods'].items()):
+                    message += (f"• {method}: {method_stats['count']} шт., "
+                                f"ср. {method_stats['avg_ms']:.0f} мс, "
+                                f"макс. {method_stats['max_ms']:.0f} мс, "
+                                f"ошибок {method_stats['errors']}\n")
+                
+                self.send_message(chat_id, message)
+            
+            elif command == "signals":
+                signals = self.db.get_signal_report(10)
+                if not signals:
+                    self.send_message(chat_id, "📡 Сигналов пока не было")
+                    return
+                
+                message = "📡 Последние сигналы:\n\n"
+                for signal in signals:
+                    status = "✅" if signal['status'] == 'done' else "⏳"
+                    created_at = datetime.fromisoformat(signal['created_at']).strftime('%d.%m %H:%M')
+                    message += (f"{status} {created_at} • message_id {'+'.join(map(str, signal['message_ids']))}\n"
+                                f"   получателей {signal['recipients']}, доставлено {signal['delivered']}, "
+                                f"не доставлено {signal['failed']}\n")
+                
+                self.send_message(chat_id, message)
+            
             elif command == "test_db":
                 try:
                     # Проверяем подключение к базе
@@ -1001,12 +1190,7 @@ active_until: {active_until}""")
 
 Выберите действие:"""
             
-            keyboard = self.create_inline_keyboard([
-                [{"text": "👥 Пользователи", "callback_data": "admin_users"}, {"text": "💰 Платежи", "callback_data": "admin_payments"}],
-                [{"text": "📊 Статистика", "callback_data": "admin_stats"}, {"text": "📢 Рассылка", "callback_data": "admin_broadcast"}],
-                [{"text": "🔍 Поиск пользователя", "callback_data": "admin_search"}, {"text": "⚡ Быстрые действия", "callback_data": "admin_quick"}],
-                [{"text": "📈 Аналитика", "callback_data": "admin_analytics"}, {"text": "⚙️ Настройки", "callback_data": "admin_settings"}]
-            ])
+            keyboard = keyboards.ADMIN_PANEL
             
             self.send_message(chat_id, admin_text, keyboard)
             
@@ -1019,108 +1203,19 @@ active_until: {active_until}""")
         """Обработка callback запросов (нажатия кнопок)"""
         try:
             data = callback_query.get("data")
-            chat_id = callback_query["message"]["chat"]["id"]
-            user_id = callback_query["from"]["id"]
-            
-            # Обработка выбора плана (теперь не используется, так как убрали inline кнопки)
-            if data.startswith("plan_"):
-                plan_key = data.replace("plan_", "")
-                self.handle_plan_selection(chat_id, user_id, plan_key)
-            
-            # Обработка админских callback
-            elif data == "admin_users":
-                if user_id in ADMIN_IDS:
-                    self.handle_admin_users(chat_id, user_id)
-                else:
-                    self.send_message(chat_id, "⛔ У вас нет прав администратора.")
-            
-            elif data == "admin_payments":
-                if user_id in ADMIN_IDS:
-                    self.handle_admin_payments(chat_id, user_id)
-                else:
-                    self.send_message(chat_id, "⛔ У вас нет прав администратора.")
-            
-            elif data == "admin_stats":
-                if user_id in ADMIN_IDS:
-                    self.handle_admin_stats(chat_id, user_id)
-                else:
-                    self.send_message(chat_id, "⛔ У вас нет прав администратора.")
-            
-            elif data == "admin_broadcast":
-                if user_id in ADMIN_IDS:
-                    self.send_message(chat_id, "✉️ Введите сообщение для рассылки всем активным пользователям.")
-                    self.db.set_user_state(user_id, "waiting_broadcast")
-                else:
-                    self.send_message(chat_id, "⛔ У вас нет прав администратора.")
-            
-            elif data == "admin_search":
-                if user_id in ADMIN_IDS:
-                    self.send_message(chat_id, "🔍 Введите username или ID пользователя для поиска:")
-                    self.db.set_user_state(user_id, "waiting_user_search")
-                else:
-                    self.send_message(chat_id, "⛔ У вас нет прав администратора.")
-            
-            elif data == "admin_quick":
-                if user_id in ADMIN_IDS:
-                    self.handle_admin_quick_actions(chat_id, user_id)
-                else:
-                    self.send_message(chat_id, "⛔ У вас нет прав администратора.")
-            
-            elif data == "admin_analytics":
-                if user_id in ADMIN_IDS:
-                    self.handle_admin_analytics(chat_id, user_id)
-                else:
-                    self.send_message(chat_id, "⛔ У вас нет прав администратора.")
-            
-            elif data == "admin_settings":
-                if user_id in ADMIN_IDS:
-                    self.handle_admin_settings(chat_id, user_id)
-                else:
-                    self.send_message(chat_id, "⛔ У вас нет прав администратора.")
-            
-            # Обработка подтверждения оплаты
-            elif data.startswith("confirm_"):
-                if user_id in ADMIN_IDS:
-                    target_user_id = int(data.replace("confirm_", ""))
-                    self.handle_confirm_payment(chat_id, user_id, target_user_id)
-                else:
-                    self.send_message(chat_id, "⛔ У вас нет прав администратора.")
-            
-            # Возврат в главное меню
-            elif data == "back_main":
-                self.handle_start(chat_id, user_id, callback_query["from"].get("username"))
-            
-            # Возврат в админ-панель
-            elif data == "back_admin_panel":
-                if user_id in ADMIN_IDS:
-                    self.handle_admin_panel(chat_id, user_id)
-                else:
-                    self.send_message(chat_id, "⛔ У вас нет прав администратора.")
-            
-            # Быстрые действия
-            elif data == "quick_confirm_all":
-                if user_id in ADMIN_IDS:
-                    self.handle_quick_confirm_all(chat_id, user_id)
-                else:
-                    self.send_message(chat_id, "⛔ У вас нет прав администратора.")
-            
-            elif data == "quick_today_stats":
-                if user_id in ADMIN_IDS:
-                    self.handle_quick_today_stats(chat_id, user_id)
-                else:
-                    self.send_message(chat_id, "⛔ У вас нет прав администратора.")
-            
-            elif data == "quick_update_statuses":
-                if user_id in ADMIN_IDS:
-                    self.handle_quick_update_statuses(chat_id, user_id)
-                else:
-                    self.send_message(chat_id, "⛔ У вас нет прав администратора.")
+            if not data:
+                return
             
-            elif data == "quick_test_message":
-                if user_id in ADMIN_IDS:
-                    self.handle_quick_test_message(chat_id, user_id)
-                else:
-                    self.send_message(chat_id, "⛔ У вас нет прав администратора.")
+            route, args = self.router.match_callback(data)
+            if route:
+                request = Request(
+                    callback_query["message"]["chat"]["id"],
+                    callback_query["from"]["id"],
+                    callback_query["from"].get("username"),
+                    args=args,
+                    message=callback_query
+                )
+                self.router.dispatch(route, request)
         
         except Exception as e:
             error_msg = f"[ERROR] Callback query: {e}"
@@ -1164,7 +1259,7 @@ active_until: {active_until}""")
                     keyboard_buttons.append([{"text": f"✅ Подтвердить @{username or 'no_username'}", "callback_data": f"confirm_{telegram_id}"}])
             
             if keyboard_buttons:
-                keyboard = self.create_inline_keyboard(keyboard_buttons)
+                keyboard = keyboards.inline_keyboard(keyboard_buttons)
                 self.send_message(chat_id, message, keyboard)
             else:
                 self.send_message(chat_id, message)
@@ -1274,7 +1369,7 @@ active_until: {active_until}""")
                 # Уведомляем пользователя
                 success_message = f"✅ Ваша подписка активирована: {plan_name}. Спасибо, что с нами!"
                 
-                self.send_message(target_user_id, success_message)
+                self.send_message(target_user_id, success_message, priority=PRIORITY_PAYMENT)
                 
                 # Логируем подтверждение в новом формате
                 active_until = end_date_str if end_date_str != "бессрочно" else "lifetime"
@@ -1299,13 +1394,7 @@ active_until: {active_until}""")
 
 Выберите действие:"""
             
-            keyboard = self.create_inline_keyboard([
-                [{"text": "✅ Подтвердить все pending", "callback_data": "quick_confirm_all"}],
-                [{"text": "📊 Статистика за сегодня", "callback_data": "quick_today_stats"}],
-                [{"text": "🔄 Обновить статусы", "callback_data": "quick_update_statuses"}],
-                [{"text": "📤 Тестовое сообщение", "callback_data": "quick_test_message"}],
-                [{"text": "↩️ Назад в панель", "callback_data": "back_admin_panel"}]
-            ])
+            keyboard = keyboards.ADMIN_QUICK_ACTIONS
             
             self.send_message(chat_id, quick_text, keyboard)
             
@@ -1472,7 +1561,7 @@ active_until: {active_until}""")
             keyboard_buttons.append([{"text": "↩️ Назад в панель", "callback_data": "back_admin_panel"}])
             
             if keyboard_buttons:
-                keyboard = self.create_inline_keyboard(keyboard_buttons)
+                keyboard = keyboards.inline_keyboard(keyboard_buttons)
                 self.send_message(chat_id, info_text, keyboard)
             else:
                 self.send_message(chat_id, info_text)
@@ -1485,61 +1574,25 @@ active_until: {active_until}""")
     def handle_quick_confirm_all(self, chat_id, user_id):
         """Быстрое подтверждение всех pending пользователей"""
         try:
-            users = self.db.get_all_users()
-            pending_users = [u for u in users if u[2] == "pending"]  # status в индексе 2
+            confirmed_users, pending_count = self.db.confirm_pending_users(PLANS)
             
-            if not pending_users:
+            if not pending_count:
                 self.send_message(chat_id, "✅ Нет пользователей со статусом 'pending' для подтверждения.")
                 return
             
-            confirmed_count = 0
-            for user_data in pending_users:
-                try:
-                    target_user_id = user_data[0]  # telegram_id
-                    target_user = self.db.get_user(target_user_id)
-                    
-                    if target_user and target_user["plan"]:
-                        plan_key = target_user["plan"]
-                        plan = PLANS.get(plan_key)
-                        
-                        if plan:
-                            start_date = datetime.now()
-                            if plan_key == "lifetime":
-                                success = self.db.update_user_status(
-                                    target_user_id, 
-                                    "active", 
-                                    plan_key, 
-                                    start_date.isoformat(), 
-                                    None
-                                )
-                                end_date_str = "бессрочно"
-                            else:
-                                end_date = start_date + timedelta(days=plan["days"])
-                                success = self.db.update_user_status(
-                                    target_user_id, 
-                                    "active", 
-                                    plan_key, 
-                                    start_date.isoformat(), 
-                                    end_date.isoformat()
-                                )
-                                end_date_str = end_date.strftime("%Y-%m-%d")
-                            
-                            if success:
-                                confirmed_count += 1
-                                
-                                # Уведомляем пользователя
-                                username = target_user["username"] or "unknown"
-                                plan_name = plan["name"]
-                                
-                                success_message = f"✅ Ваша подписка активирована: {plan_name}. Спасибо, что с нами!"
-                                
-                                self.send_message(target_user_id, success_message)
-                                
-                except Exception as e:
-                    print(f"[ERROR] Подтверждение пользователя {target_user_id}: {e}")
+            # Уведомления уходят через очередь исходящих параллельно с ответом админу
+            self.outbox.enqueue_many("sendMessage", [
+                {
+                    "chat_id": user["telegram_id"],
+                    "text": f"✅ Ваша подписка активирована: {PLANS[user['plan']]['name']}. Спасибо, что с нами!",
+                    "parse_mode": "HTML"
+                }
+                for user in confirmed_users
+            ], PRIORITY_PAYMENT)
+            confirmed_count = len(confirmed_users)
             
-            self.send_message(chat_id, f"✅ Подтверждено {confirmed_count} из {len(pending_users)} пользователей.")
-            self.send_log(f"[QUICK CONFIRM] Подтверждено {confirmed_count} пользователей с тарифами")
+            self.send_message(chat_id, f"✅ Подтверждено {confirmed_count} из {pending_count} пользователей.")
+            self.send_log(f"[QUICK CONFIRM] Подтверждено {confirmed_count} пользователей с тарифами: {self.format_user_list(confirmed_users)}")
             
         except Exception as e:
             error_msg = f"[ERROR] Быстрое подтверждение: {e}"
@@ -1572,18 +1625,7 @@ active_until: {active_until}""")
         """Быстрое обновление статусов пользователей"""
         try:
             # Обновляем просроченные подписки
-            expired_users = self.db.get_expired_users()
-            updated_count = 0
-            
-            for user in expired_users:
-                user_id_expired = user["telegram_id"]
-                username = user["username"]
-                
-                self.db.update_user_status(user_id_expired, "expired")
-                self.send_message(user_id_expired, "❌ Ваша подписка истекла. Для продолжения получения сигналов продлите подписку.")
-                updated_count += 1
-                
-                self.send_log(f"[EXPIRED] user: @{username} (ID: {user_id_expired})")
+            updated_count = self.expire_subscriptions()
             
             self.send_message(chat_id, f"🔄 Обновлено статусов: {updated_count} пользователей")
             self.send_log(f"[QUICK UPDATE] Обновлено {updated_count} статусов")
@@ -1611,6 +1653,102 @@ active_until: {active_until}""")
             print(error_msg)
             self.send_log(error_msg)
 
+    def deny_admin(self, request, route):
+        """Ответ на маршрут, доступный только администраторам"""
+        self.send_message(request.chat_id, "⛔ У вас нет прав администратора.")
+        if route.kind == STATE:
+            self.db.set_user_state(request.user_id, None)
+    
+    def handle_payment_method(self, request, handler):
+        """Выбор способа оплаты: тариф берется из состояния пользователя"""
+        user_state = request.user_state
+        if user_state and user_state.startswith("payment_method_"):
+            plan_key = user_state.replace("payment_method_", "")
+            handler(request.chat_id, request.user_id, plan_key)
+        else:
+            self.send_message(request.chat_id, "❌ Сначала выберите тариф")
+    
+    def handle_back(self, chat_id):
+        """Возврат в главное меню по кнопке «Назад»"""
+        keyboard = keyboards.MAIN_MENU
+        self.send_message(chat_id, "Вы вернулись в главное меню.", keyboard)
+    
+    def handle_broadcast_text(self, chat_id, user_id, text):
+        """Рассылка текста, введенного администратором"""
+        queued_count = self.broadcast(self.recipients.snapshot(), text)
+        
+        self.send_log(f"[BROADCAST] Сообщение поставлено в очередь для {queued_count} пользователей")
+        self.send_message(chat_id, f"✅ Сообщение поставлено в очередь для {queued_count} пользователей")
+        self.db.set_user_state(user_id, None)
+    
+    def handle_user_search_text(self, chat_id, user_id, text):
+        """Поиск пользователя по введенному администратором запросу"""
+        self.handle_user_search(chat_id, user_id, text)
+        self.db.set_user_state(user_id, None)
+    
+    def ask_admin_input(self, chat_id, user_id, prompt, state):
+        """Запрос ввода у администратора с переводом в состояние ожидания"""
+        self.send_message(chat_id, prompt)
+        self.db.set_user_state(user_id, state)
+    
+    def build_router(self):
+        """Таблицы маршрутов для сообщений, команд, callback и состояний"""
+        router = Router(ADMIN_IDS, self.deny_admin)
+        
+        # Кнопки reply-клавиатуры
+        router.add_text("📈 Получать сигналы", lambda r: self.handle_get_signals(r.chat_id, r.user_id))
+        router.add_text("🆘 Помощь", lambda r: self.handle_help_faq(r.chat_id))
+        router.add_text("💰 Оплата", lambda r: self.handle_payment_start(r.chat_id, r.user_id))
+        router.add_text("✅ Я оплатил", lambda r: self.handle_payment_done(r.chat_id, r.user_id))
+        router.add_text("1 месяц — 39 USDT", lambda r: self.handle_plan_selection(r.chat_id, r.user_id, "1m"))
+        router.add_text("3 месяца — 99 USDT", lambda r: self.handle_plan_selection(r.chat_id, r.user_id, "3m"))
+        router.add_text("Пожизненно — 239 USDT", lambda r: self.handle_plan_selection(r.chat_id, r.user_id, "lifetime"))
+        router.add_text("💰 Оплатить криптой (TRC20)", lambda r: self.handle_payment_method(r, self.handle_crypto_payment))
+        router.add_text("⚡ Оплатить через Tribute", lambda r: self.handle_payment_method(r, self.handle_tribute_payment))
+        router.add_text("📸 Отправить скрин", lambda r: self.send_message(r.chat_id, "📸 Отправьте скриншот перевода:"))
+        router.add_text("↩️ Назад", lambda r: self.handle_back(r.chat_id))
+        router.add_text("ℹ️ Мой статус", lambda r: self.handle_status(r.chat_id, r.user_id))
+        router.add_text("🧾 Поддержка", lambda r: self.handle_support(r.chat_id))
+        
+        # Команды
+        router.add_command("start", lambda r: self.handle_start(r.chat_id, r.user_id, r.username))
+        router.add_command("status", lambda r: self.handle_status(r.chat_id, r.user_id))
+        for command in ("users", "payments", "stats", "help", "test_log", "test_forward", "test_db", "net_stats", "signals"):
+            router.add_command(command, lambda r, command=command: self.handle_admin_command(r.chat_id, r.user_id, command, []), admin=True)
+        for command in ("confirm", "broadcast"):
+            router.add_command(command, lambda r, command=command: self.handle_admin_command(r.chat_id, r.user_id, command, r.args), admin=True)
+        router.add_command("admin", lambda r: self.handle_admin_panel(r.chat_id, r.user_id), admin=True)
+        router.add_command("panel", lambda r: self.handle_admin_panel(r.chat_id, r.user_id), admin=True)
+        
+        # Состояния пользователя
+        router.add_state("waiting_txid", lambda r: self.handle_txid(r.chat_id, r.user_id, r.username, r.text))
+        router.add_state("waiting_broadcast", lambda r: self.handle_broadcast_text(r.chat_id, r.user_id, r.text), admin=True)
+        router.add_state("waiting_user_search", lambda r: self.handle_user_search_text(r.chat_id, r.user_id, r.text), admin=True)
+        
+        # Callback-кнопки
+        router.add_callback_prefix("plan_", lambda r: self.handle_plan_selection(r.chat_id, r.user_id, r.args[0]))
+        router.add_callback_prefix("confirm_", lambda r: self.handle_confirm_payment(r.chat_id, r.user_id, int(r.args[0])), admin=True)
+        router.add_callback("admin_users", lambda r: self.handle_admin_users(r.chat_id, r.user_id), admin=True)
+        router.add_callback("admin_payments", lambda r: self.handle_admin_payments(r.chat_id, r.user_id), admin=True)
+        router.add_callback("admin_stats", lambda r: self.handle_admin_stats(r.chat_id, r.user_id), admin=True)
+        router.add_callback("admin_broadcast", lambda r: self.ask_admin_input(
+            r.chat_id, r.user_id, "✉️ Введите сообщение для рассылки всем активным пользователям.", "waiting_broadcast"
+        ), admin=True)
+        router.add_callback("admin_search", lambda r: self.ask_admin_input(
+            r.chat_id, r.user_id, "🔍 Введите username или ID пользователя для поиска:", "waiting_user_search"
+        ), admin=True)
+        router.add_callback("admin_quick", lambda r: self.handle_admin_quick_actions(r.chat_id, r.user_id), admin=True)
+        router.add_callback("admin_analytics", lambda r: self.handle_admin_analytics(r.chat_id, r.user_id), admin=True)
+        router.add_callback("admin_settings", lambda r: self.handle_admin_settings(r.chat_id, r.user_id), admin=True)
+        router.add_callback("back_main", lambda r: self.handle_start(r.chat_id, r.user_id, r.username))
+        router.add_callback("back_admin_panel", lambda r: self.handle_admin_panel(r.chat_id, r.user_id), admin=True)
+        router.add_callback("quick_confirm_all", lambda r: self.handle_quick_confirm_all(r.chat_id, r.user_id), admin=True)
+        router.add_callback("quick_today_stats", lambda r: self.handle_quick_today_stats(r.chat_id, r.user_id), admin=True)
+        router.add_callback("quick_update_statuses", lambda r: self.handle_quick_update_statuses(r.chat_id, r.user_id), admin=True)
+        router.add_callback("quick_test_message", lambda r: self.handle_quick_test_message(r.chat_id, r.user_id), admin=True)
+        
+        return router
+    
     def process_message(self, message):
         """Обработка текстовых сообщений"""
         try:
@@ -1621,134 +1759,18 @@ active_until: {active_until}""")
             
             # Проверяем состояние пользователя
             user_state = self.db.get_user_state(user_id)
-        
-            if text.startswith("/start"):
-                self.handle_start(chat_id, user_id, username)
-            
-            elif text == "📈 Получать сигналы":
-                self.handle_get_signals(chat_id, user_id)
-            
-            elif text == "🆘 Помощь":
-                self.handle_help_faq(chat_id)
-            
-            elif text == "💰 Оплата":
-                self.handle_payment_start(chat_id, user_id)
-            
-            elif text == "✅ Я оплатил":
-                self.handle_payment_done(chat_id, user_id)
-            
-            # Обработка выбора тарифов
-            elif text == "1 месяц — 39 USDT":
-                self.handle_plan_selection(chat_id, user_id, "1m")
-            elif text == "3 месяца — 99 USDT":
-                self.handle_plan_selection(chat_id, user_id, "3m")
-            elif text == "Пожизненно — 239 USDT":
-                self.handle_plan_selection(chat_id, user_id, "lifetime")
-            
-            # Обработка выбора методов оплаты
-            elif text == "💰 Оплатить криптой (TRC20)":
-                # Определяем план из состояния пользователя
-                if user_state and user_state.startswith("payment_method_"):
-                    plan_key = user_state.replace("payment_method_", "")
-                    self.handle_crypto_payment(chat_id, user_id, plan_key)
-                else:
-                    self.send_message(chat_id, "❌ Сначала выберите тариф")
+            request = Request(chat_id, user_id, username, text, user_state=user_state, message=message)
             
-            elif text == "⚡ Оплатить через Tribute":
-                # Определяем план из состояния пользователя
-                if user_state and user_state.startswith("payment_method_"):
-                    plan_key = user_state.replace("payment_method_", "")
-                    self.handle_tribute_payment(chat_id, user_id, plan_key)
-                else:
-                    self.send_message(chat_id, "❌ Сначала выберите тариф")
-            
-            elif text == "📸 Отправить скрин":
-                # Если пользователь нажал кнопку "Отправить скрин", просим отправить фото
-                self.send_message(chat_id, "📸 Отправьте скриншот перевода:")
-            
-            elif text == "↩️ Назад":
-                keyboard = self.create_reply_keyboard([
-                    ["📈 Получать сигналы"],
-                    ["💰 Оплата"],
-                    ["ℹ️ Мой статус"],
-                    ["🧾 Поддержка", "🆘 Помощь"]
-                ])
-                self.send_message(chat_id, "Вы вернулись в главное меню.", keyboard)
-            
-            elif text == "ℹ️ Мой статус" or text.startswith("/status"):
-                self.handle_status(chat_id, user_id)
-        
-            elif text == "🧾 Поддержка":
-                self.handle_support(chat_id)
-            
-            elif text.startswith("/users"):
-                self.handle_admin_command(chat_id, user_id, "users", [])
-            
-            elif text.startswith("/confirm"):
-                args = text.split()[1:] if len(text.split()) > 1 else []
-                self.handle_admin_command(chat_id, user_id, "confirm", args)
-            
-            elif text.startswith("/payments"):
-                self.handle_admin_command(chat_id, user_id, "payments", [])
-            
-            elif text.startswith("/broadcast"):
-                args = text.split()[1:] if len(text.split()) > 1 else []
-                self.handle_admin_command(chat_id, user_id, "broadcast", args)
-            
-            elif text.startswith("/stats"):
-                self.handle_admin_command(chat_id, user_id, "stats", [])
-            
-            elif text.startswith("/help"):
-                self.handle_admin_command(chat_id, user_id, "help", [])
-            
-            elif text.startswith("/test_log"):
-                self.handle_admin_command(chat_id, user_id, "test_log", [])
-            
-            elif text.startswith("/test_forward"):
-                self.handle_admin_command(chat_id, user_id, "test_forward", [])
-            
-            elif text.startswith("/test_db"):
-                self.handle_admin_command(chat_id, user_id, "test_db", [])
-            
-            elif text.startswith("/admin"):
-                self.handle_admin_panel(chat_id, user_id)
+            # Кнопки и команды
+            route, request.args = self.router.match_text(text)
+            if route:
+                self.router.dispatch(route, request)
+                return
             
-            elif text.startswith("/panel"):
-                self.handle_admin_panel(chat_id, user_id)
-        
             # Обработка состояний пользователя
-            elif user_state == "waiting_txid":
-                self.handle_txid(chat_id, user_id, username, text)
-            
-            # Обработка рассылки для админа
-            elif user_state == "waiting_broadcast":
-                if user_id in ADMIN_IDS:
-                    active_users = self.db.get_active_users()
-                    sent_count = 0
-                    
-                    for target_user_id in active_users:
-                        try:
-                            if self.send_message(target_user_id, text):
-                                sent_count += 1
-                            time.sleep(0.1)
-                        except Exception as e:
-                            print(f"[ERROR] Рассылка пользователю {target_user_id}: {e}")
-                    
-                    self.send_log(f"[BROADCAST] Сообщение доставлено {sent_count} пользователям")
-                    self.send_message(chat_id, f"✅ Сообщение отправлено {sent_count} пользователям")
-                    self.db.set_user_state(user_id, None)
-                else:
-                    self.send_message(chat_id, "⛔ У вас нет прав администратора.")
-                    self.db.set_user_state(user_id, None)
-            
-            # Обработка поиска пользователя для админа
-            elif user_state == "waiting_user_search":
-                if user_id in ADMIN_IDS:
-                    self.handle_user_search(chat_id, user_id, text)
-                    self.db.set_user_state(user_id, None)
-                else:
-                    self.send_message(chat_id, "⛔ У вас нет прав администратора.")
-                    self.db.set_user_state(user_id, None)
+            route = self.router.match_state(user_state)
+            if route:
+                self.router.dispatch(route, request)
             
             # Обработка скриншотов
             elif message.get("photo"):
@@ -1764,83 +1786,135 @@ active_until: {active_until}""")
             print(error_msg)
             self.send_log(error_msg)
     
+    def is_signal_recipient(self, user_id):
+        """Получатель еще в рассылке (недоступные удаляются из RecipientSet при ошибке отправки)"""
+        return user_id in self.recipients or user_id in ADMIN_IDS
+    
+    def forward_signal(self, user_id, message_ids):
+        """Пересылка поста или альбома сигнала; при неудаче — повтор через очередь исходящих"""
+        if len(message_ids) == 1:
+            if self.forward_message(SIGNAL_CHANNEL_ID, user_id, message_ids[0]):
+                return True
+            if not self.is_signal_recipient(user_id):
+                return False
+            self.forward_message(SIGNAL_CHANNEL_ID, user_id, message_ids[0], priority=PRIORITY_SIGNAL)
+            return False
+        if self.forward_messages(SIGNAL_CHANNEL_ID, user_id, message_ids):
+            return True
+        if not self.is_signal_recipient(user_id):
+            return False
+        self.forward_messages(SIGNAL_CHANNEL_ID, user_id, message_ids, priority=PRIORITY_SIGNAL)
+        return False
+    
     def check_signal_channel(self, updates):
-        """Проверка новых сообщений в сигнальном канале"""
+        """Передача постов сигнального канала из пачки обновлений на пересылку"""
         try:
-            new_messages = []
-            for update in updates:
-                message = update.get("channel_post") or update.get("edited_channel_post")
-                if not message:
-                    continue
-                if message.get("chat", {}).get("id") != SIGNAL_CHANNEL_ID:
-                    continue
-
-                message_id = message.get("message_id")
-                if self.last_message_id is None or message_id > self.last_message_id:
-                    self.last_message_id = message_id
-                    new_messages.append(message)
-
-            if not new_messages:
-                return
-
-            # Получаем активных пользователей + админов
-            active_users = self.db.get_active_users()
-            all_recipients = list(set(active_users + ADMIN_IDS))
-
-            for message in new_messages:
-                message_id = message.get("message_id")
-                forwarded_count = 0
-                for user_id in all_recipients:
-                    try:
-                        # Пересылаем любое сообщение (включая фото, видео, документы)
-                        ok = self.forward_message(SIGNAL_CHANNEL_ID, user_id, message_id)
-                        if ok:
-                            forwarded_count += 1
-                        time.sleep(0.05)
-                    except Exception as e:
-                        print(f"[ERROR] Пересылка сигнала {message_id} -> {user_id}: {e}")
-
-                if forwarded_count > 0:
-                    self.send_log(f"[SIGNAL FORWARDED] message_id={message_id}, users={forwarded_count}")
-
+            self.signals.submit(updates)
         except Exception as e:
             self.send_log(f"[ERROR] check_signal_channel: {e}")
-
     
-    def check_subscriptions(self):
-        """Проверка подписок на истечение"""
+    def deliver_signal(self, batches):
+        """Пересылка новых постов сигнального канала всем получателям; альбом — одним запросом"""
         try:
-            # Проверяем подписки, которые истекают завтра
-            tomorrow = datetime.now() + timedelta(days=1)
-            expiring_users = self.db.get_expiring_users(tomorrow)
-            
-            for user in expiring_users:
-                user_id = user["telegram_id"]
-                username = user["username"]
-                end_date_dt = self.safe_parse_date(user.get("end_date"))
-                if end_date_dt:
-                    end_date_str = end_date_dt.strftime("%d.%m.%Y")
-                    self.send_message(user_id, f"⚠️ Ваша подписка истекет завтра ({end_date_str}). Продлите подписку для продолжения получения сигналов.")
-                    self.send_log(f"[REMINDER] user: @{username} (ID: {user_id}), expires: {end_date_str}")
-                else:
-                    self.send_message(user_id, f"⚠️ Ваша подписка скоро истекает. Продлите подписку для продолжения получения сигналов.")
-                    self.send_log(f"[REMINDER] user: @{username} (ID: {user_id}), expires: неизвестно")
-            
-            # Проверяем просроченные подписки
-            expired_users = self.db.get_expired_users()
-            
-            for user in expired_users:
-                user_id = user["telegram_id"]
-                username = user["username"]
-                
-                self.db.update_user_status(user_id, "expired")
-                self.send_message(user_id, "❌ Ваша подписка истекла. Для продолжения получения сигналов продлите подписку.")
-                self.send_log(f"[EXPIRED] user: @{username} (ID: {user_id})")
-                
+            payloads = [[message.get("message_id") for message in batch] for batch in batches]
+            self.fan_out_signals(payloads, batches[0][0].get("date"))
         except Exception as e:
-            error_msg = f"[ERROR] Проверка подписок: {e}"
-            print(error_msg)
-            self.send_log(error_msg)
+            # SignalIngestor оставит посты в ожидании и повторит рассылку
+            self.send_log(f"[ERROR] deliver_signal: {e}")
+            raise
+    
+    def fan_out_signals(self, payloads, posted_at=None, resumed=False):
+        """Рассылка сигналов с отметками в журнале доставки
+
+        Сигнал (пост или альбом) записывается в журнал до начала рассылки, каждая
+        отправка захватывается в журнале перед отправкой и отмечается после ответа
+        Telegram. Получатели, уже захваченные в журнале (возобновление после
+        перезапуска или одновременный повтор поста), пропускаются и считаются
+        отдельно от доставленных.
+        """
+        # Активные подписчики из памяти + админы
+        all_recipients = self.recipients.snapshot(ADMIN_IDS)
+
+        for message_ids in payloads:
+            self.db.start_signal(message_ids[0], message_ids, len(all_recipients))
+
+        def send(user_id, message_ids):
+            if not self.db.claim_signal_delivery(message_ids[0], user_id):
+                return SKIPPED
+            delivered = self.forward_signal(user_id, message_ids)
+            if delivered:
+                self.db.record_signal_delivery(message_ids[0], user_id)
+            return delivered
+
+        # Пересылаем любое сообщение (включая фото, видео, документы) всем получателям параллельно;
+        # темп отправки задает общий RateLimiter
+        report = self.fanout.deliver(all_recipients, payloads, send)
+        for message_ids in payloads:
+            self.db.finish_signal(message_ids[0])
+
+        if report["delivered"] > 0:
+            since_post = f"{time.time() - posted_at:.1f}s" if posted_at else "n/a"
+            self.send_log(
+                f"[SIGNAL {'RESUMED' if resumed else 'FORWARDED'}] "
+                f"message_id={','.join('+'.join(map(str, ids)) for ids in payloads)}, "
+                f"users={report['recipients']}, delivered={report['delivered']}, skipped={report['skipped']}, "
+                f"failed={report['failed']}, last_delivery={report['last_delivery']:.1f}s, since_post={since_post}"
+            )
+        return report
+    
+    def resume_signals(self):
+        """Досылка сигналов, рассылка которых прервалась остановкой бота"""
+        try:
+            for signal_id, message_ids in self.db.get_running_signals():
+                self.fan_out_signals([message_ids], resumed=True)
+            pruned = self.db.prune_signal_deliveries()
+            if pruned:
+                print(f"[SIGNALS] Удалено старых записей журнала доставки: {pruned}")
+        except Exception as e:
+            self.send_log(f"[ERROR] resume_signals: {e}")
+    
+    @staticmethod
+    def format_user_list(users, limit=20):
+        """Краткий список пользователей для сводной строки лога"""
+        names = [
+            f"@{user['username']} (ID: {user['telegram_id']})" if user.get("username") else f"ID: {user['telegram_id']}"
+            for user in users[:limit]
+        ]
+        if len(users) > limit:
+            names.append(f"и еще {len(users) - limit}")
+        return ", ".join(names)
+    
+    def expire_subscriptions(self):
+        """Перевод просроченных подписок в expired и постановка уведомлений в очередь"""
+        expired_users = self.db.expire_users()
+        if not expired_users:
+            return 0
+        
+        self.outbox.enqueue_many("sendMessage", [
+            {
+                "chat_id": user["telegram_id"],
+                "text": "❌ Ваша подписка истекла. Для продолжения получения сигналов продлите подписку.",
+                "parse_mode": "HTML"
+            }
+            for user in expired_users
+        ], PRIORITY_BROADCAST)
+        self.send_log(f"[EXPIRED] {len(expired_users)} users: {self.format_user_list(expired_users)}")
+        return len(expired_users)
+    
+    def send_expiry_reminders(self, users):
+        """Напоминания о скором окончании подписки (вызывается планировщиком)"""
+        reminders = []
+        for user in users:
+            end_date_dt = self.safe_parse_date(user.get("end_date"))
+            if end_date_dt:
+                text = f"⚠️ Ваша подписка истекет завтра ({end_date_dt.strftime('%d.%m.%Y')}). Продлите подписку для продолжения получения сигналов."
+            else:
+                text = "⚠️ Ваша подписка скоро истекает. Продлите подписку для продолжения получения сигналов."
+            reminders.append({"chat_id": user["telegram_id"], "text": text, "parse_mode": "HTML"})
+        
+        if reminders:
+            self.outbox.enqueue_many("sendMessage", reminders, PRIORITY_BROADCAST)
+            self.send_log(f"[REMINDER] {len(reminders)} users: {self.format_user_list(users)}")
     
     def create_daily_backup(self):
         """Создание ежедневного резервного копирования"""
@@ -1862,18 +1936,6 @@ active_until: {active_until}""")
             print(error_msg)
             self.send_log(error_msg)
     
-    def subscription_checker_thread(self):
-        """Поток для проверки подписок"""
-        while self.running:
-            try:
-                self.check_subscriptions()
-                time.sleep(86400)  # Проверяем раз в день
-            except Exception as e:
-                error_msg = f"[ERROR] Поток проверки подписок: {e}"
-                print(error_msg)
-                self.send_log(error_msg)
-                time.sleep(3600)  # При ошибке ждем час
-    
     def backup_thread(self):
         """Поток для ежедневного резервного копирования и отчетов"""
         last_report_date = None
@@ -1914,79 +1976,100 @@ active_until: {active_until}""")
         except Exception as e:
             print(f"[ERROR] Ежедневный отчет: {e}")
     
-    def run(self):
-        """Основной цикл бота - единый polling для всех операций"""
-        self.running = True
+    @staticmethod
+    def get_update_chat_id(update):
+        """Определение chat_id обновления (для сохранения порядка по чатам)
+
+        Не выбрасывает исключений: у callback_query старого или inline-сообщения
+        нет поля message, тогда ключом служит отправитель; обновления без чата
+        попадают в очередь 0.
+        """
+        callback = update.get("callback_query")
+        if callback:
+            chat_id = (callback.get("message") or {}).get("chat", {}).get("id")
+            return chat_id if chat_id is not None else callback.get("from", {}).get("id", 0)
+        message = update.get("message") or update.get("channel_post") or update.get("edited_channel_post")
+        if message:
+            return message.get("chat", {}).get("id", 0)
+        return 0
+    
+    def log_update_error(self, error):
+        """Ошибка обработчика обновления в рабочем потоке"""
+        error_msg = f"[ERROR] Обработка обновления: {error}"
+        print(error_msg)
+        self.send_log(error_msg)
+    
+    def handle_update(self, update):
+        """Обработка одного обновления Telegram"""
+        if "channel_post" in update or "edited_channel_post" in update:
+            self.check_signal_channel([update])
         
-        # Запускаем только потоки для фоновых задач
-        subscription_thread = threading.Thread(target=self.subscription_checker_thread)
-        subscription_thread.daemon = True
-        subscription_thread.start()
+        elif "message" in update:
+            self.process_message(update["message"])
+        
+        elif "callback_query" in update:
+            self.process_callback_query(update["callback_query"])
+            
+            # Безопасно отвечаем на callback, чтобы Telegram не ругался
+            try:
+                callback_query_id = update["callback_query"]["id"]
+                self.send_request("answerCallbackQuery", {"callback_query_id": callback_query_id})
+            except Exception:
+                pass
+    
+    def start_background_threads(self):
+        """Запуск потоков для фоновых задач"""
+        # Напоминания и истечение подписок — точно в срок по куче end_date
+        self.scheduler.start()
+        
+        # Прерванные перезапуском рассылки сигналов досылаются в фоне
+        threading.Thread(target=self.resume_signals, name="signal-resume", daemon=True).start()
         
         backup_thread = threading.Thread(target=self.backup_thread)
         backup_thread.daemon = True
         backup_thread.start()
+    
+    def run(self):
+        """Основной цикл бота: конвейер long polling и параллельных обработчиков"""
+        self.running = True
         
-        offset = None
-        last_check_time = time.time()
+        # Запускаем только потоки для фоновых задач
+        self.start_background_threads()
+        
+        # getUpdates не работает, пока установлен webhook (после запуска с --webhook)
+        self.send_request("deleteWebhook", log_errors=False)
+        
+        self.pipeline = UpdatePipeline(self, UPDATE_CONSUMERS, UPDATE_QUEUE_SIZE)
+        self.update_executor = self.pipeline.executor
+        self.pipeline.start()
         
         print("[BOT] Запущен и готов")
         self.send_log("[BOT] Запущен и готов")
         
-        while self.running:
-            try:
-                # Получаем обновления
-                updates = self.get_updates(offset, timeout=30)
-                
-                # Проверяем сигнальный канал каждые 10 секунд
-                current_time = time.time()
-                if current_time - last_check_time >= 10:
-                    self.check_signal_channel(updates)
-                    last_check_time = current_time
-                
-                # Обрабатываем все обновления
-                for update in updates:
-                    offset = update["update_id"] + 1
-                    
-                    if "message" in update:
-                        self.process_message(update["message"])
-                    
-                    elif "callback_query" in update:
-                        self.process_callback_query(update["callback_query"])
-                        
-                        # Безопасно отвечаем на callback, чтобы Telegram не ругался
-                        try:
-                            callback_query_id = update["callback_query"]["id"]
-                            self.send_request("answerCallbackQuery", {"callback_query_id": callback_query_id})
-                        except Exception:
-                            pass
-                
-            except KeyboardInterrupt:
-                print("\n[BOT] Остановка...")
-                self.running = False
-                self.send_log("[BOT] Остановлен")
-                break
-            
-            except requests.exceptions.Timeout:
-                # Игнорируем timeout ошибки
+        try:
+            while self.running:
                 time.sleep(1)
-                continue
-            
-            except requests.exceptions.RequestException as e:
-                # Игнорируем сетевые ошибки
-                if "409" not in str(e) and "timeout" not in str(e).lower():
-                    print(f"[NETWORK ERROR] {e}")
-                time.sleep(3)
-                continue
-            
-            except Exception as e:
-                error_msg = f"[ERROR] Основной цикл: {e}"
-                print(error_msg)
-                # Не логируем все ошибки, чтобы не спамить канал
-                if "no such column" not in str(e).lower():
-                    self.send_log(error_msg)
-                time.sleep(3)
+        except KeyboardInterrupt:
+            print("\n[BOT] Остановка...")
+        finally:
+            self.running = False
+            self.pipeline.stop()
+            self.signals.stop()
+            self.send_log("[BOT] Остановлен")
+            self.log_sink.close()
+            self.outbox.stop()
+
 
 if __name__ == "__main__":
     bot = SignalBot()
-    bot.run()
+    if WEBHOOK_MODE or "--webhook" in sys.argv:
+        from webhook import WebhookServer
+        WebhookServer(
+            bot, WEBHOOK_HOST, WEBHOOK_PORT, WEBHOOK_PATH, WEBHOOK_SECRET,
+            WEBHOOK_URL, WEBHOOK_WORKERS, WEBHOOK_QUEUE_SIZE
+        ).run()
+    elif ASYNC_MODE or "--async" in sys.argv:
+        from async_runtime import AsyncBotRuntime
+        AsyncBotRuntime(bot, ASYNC_CONCURRENCY).run()
+    else:
+        bot.run()
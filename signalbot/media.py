@@ -0,0 +1,66 @@
+import hashlib
+import os
+import threading
+
+
+class MediaRegistry:
+    """Реестр загруженных в Telegram локальных файлов
+
+    Каждый файл загружается один раз, его file_id сохраняется в базе по
+    SHA-256 содержимого, а дальше файл отправляется по file_id. Если файл
+    на диске изменился, хэш меняется и файл загружается заново.
+    """
+
+    def __init__(self, db):
+        self.db = db
+        self._lock = threading.Lock()
+        # path -> (mtime_ns, size, content_hash): не пересчитываем хэш неизменного файла
+        self._hashes = {}
+        # content_hash -> file_id
+        self._file_ids = {}
+
+    def content_hash(self, path):
+        """SHA-256 содержимого файла с кэшированием по mtime и размеру"""
+        stat = os.stat(path)
+        with self._lock:
+            cached = self._hashes.get(path)
+        if cached and cached[0] == stat.st_mtime_ns and cached[1] == stat.st_size:
+            return cached[2]
+
+        digest = hashlib.sha256()
+        with open(path, "rb") as file:
+            for chunk in iter(lambda: file.read(65536), b""):
+                digest.update(chunk)
+        content_hash = digest.hexdigest()
+
+        with self._lock:
+            self._hashes[path] = (stat.st_mtime_ns, stat.st_size, content_hash)
+        return content_hash
+
+    def get_file_id(self, path):
+        """file_id файла или None, если его еще нужно загрузить"""
+        content_hash = self.content_hash(path)
+        with self._lock:
+            file_id = self._file_ids.get(content_hash)
+        if file_id:
+            return file_id
+
+        file_id = self.db.get_media_file_id(content_hash)
+        if file_id:
+            with self._lock:
+                self._file_ids[content_hash] = file_id
+        return file_id
+
+    def remember(self, path, file_id):
+        """Сохранение file_id после загрузки файла"""
+        content_hash = self.content_hash(path)
+        with self._lock:
+            self._file_ids[content_hash] = file_id
+        self.db.save_media_file_id(content_hash, file_id, os.path.basename(path))
+
+    def forget(self, path):
+        """Сброс file_id, который Telegram больше не принимает"""
+        content_hash = self.content_hash(path)
+        with self._lock:
+            self._file_ids.pop(content_hash, None)
+        self.db.delete_media_file_id(content_hash)
@@ -0,0 +1,195 @@
+"""Версионированные миграции схемы базы данных
+
+Текущая версия схемы хранится в PRAGMA user_version. Каждая миграция
+выполняется в отдельной транзакции вместе с повышением версии, поэтому
+при ошибке база остается в предыдущем согласованном состоянии. Если схема
+актуальна, проверка сводится к одному чтению PRAGMA.
+
+Новая миграция добавляется в конец списка MIGRATIONS со следующим номером.
+"""
+
+
+def _columns(conn, table):
+    return {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+
+
+def _add_column(conn, table, column, definition):
+    """Добавление колонки, если ее еще нет (базы, созданные старыми версиями бота)"""
+    if column not in _columns(conn, table):
+        conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+
+
+def _migration_1(conn):
+    """Базовая схема: таблицы users и payments со всеми колонками"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            telegram_id INTEGER UNIQUE NOT NULL,
+            username TEXT,
+            status TEXT DEFAULT 'none',
+            plan TEXT DEFAULT 'none',
+            start_date TEXT,
+            end_date TEXT,
+            joined_at TEXT NOT NULL,
+            last_seen TEXT,
+            user_state TEXT
+        )
+    ''')
+
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS payments (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            txid TEXT,
+            screenshot_file_id TEXT,
+            status TEXT DEFAULT 'pending',
+            payment_method TEXT DEFAULT 'crypto',
+            plan TEXT,
+            created_at TEXT NOT NULL,
+            FOREIGN KEY (user_id) REFERENCES users (telegram_id)
+        )
+    ''')
+
+    # Колонки, которых может не быть в базах до появления миграций
+    _add_column(conn, "users", "user_state", "TEXT")
+    _add_column(conn, "users", "plan", "TEXT DEFAULT 'none'")
+    _add_column(conn, "users", "last_seen", "TEXT")
+    _add_column(conn, "payments", "payment_method", "TEXT DEFAULT 'crypto'")
+    _add_column(conn, "payments", "plan", "TEXT")
+
+
+def _migration_2(conn):
+    """Индексы под выборки подписок, статистики и последнего платежа"""
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_users_status_end_date ON users (status, end_date, plan, telegram_id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_users_joined_at ON users (joined_at)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_payments_user_created ON payments (user_id, created_at)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_payments_created_at ON payments (created_at)")
+
+
+def _migration_3(conn):
+    """file_id загруженных в Telegram локальных файлов по хэшу содержимого"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS media_cache (
+            content_hash TEXT PRIMARY KEY,
+            file_id TEXT NOT NULL,
+            file_name TEXT,
+            updated_at TEXT NOT NULL
+        )
+    ''')
+
+
+def _migration_4(conn):
+    """Персистентная очередь исходящих запросов к Telegram"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS outbound_queue (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            method TEXT NOT NULL,
+            params TEXT NOT NULL,
+            priority INTEGER NOT NULL,
+            status TEXT NOT NULL DEFAULT 'pending',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            next_attempt_at REAL NOT NULL,
+            last_error TEXT,
+            created_at TEXT NOT NULL
+        )
+    ''')
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_outbound_queue_ready ON outbound_queue (status, priority, next_attempt_at)")
+
+
+def _migration_5(conn):
+    """Срок подписки, о котором пользователь уже получил напоминание"""
+    _add_column(conn, "users", "reminded_end_date", "TEXT")
+
+
+def _migration_6(conn):
+    """Служебные значения бота (последний пересланный сигнал и т.п.)"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS bot_state (
+            key TEXT PRIMARY KEY,
+            value TEXT,
+            updated_at TEXT NOT NULL
+        ) WITHOUT ROWID
+    ''')
+
+
+def _migration_7(conn):
+    """Журнал рассылки сигналов для возобновления после перезапуска"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS signals (
+            signal_id INTEGER PRIMARY KEY,
+            message_ids TEXT NOT NULL,
+            recipients INTEGER NOT NULL,
+            status TEXT NOT NULL DEFAULT 'running',
+            created_at TEXT NOT NULL,
+            finished_at TEXT
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS signal_deliveries (
+            signal_id INTEGER NOT NULL,
+            recipient_id INTEGER NOT NULL,
+            delivered INTEGER NOT NULL,
+            PRIMARY KEY (signal_id, recipient_id)
+        ) WITHOUT ROWID
+    ''')
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_signals_status ON signals (status)")
+
+
+def _migration_8(conn):
+    """Получатели, заблокировавшие бота или удалившие аккаунт"""
+    _add_column(conn, "users", "unreachable_at", "TEXT")
+    _add_column(conn, "users", "unreachable_reason", "TEXT")
+
+
+def _migration_9(conn):
+    """Индекс активных подписок снова покрывает get_active_users (фильтр по unreachable_at)"""
+    conn.execute("DROP INDEX IF EXISTS idx_users_status_end_date")
+    conn.execute("CREATE INDEX idx_users_status_end_date ON users (status, end_date, plan, telegram_id, unreachable_at)")
+
+
+# (версия, описание, функция миграции) — строго по возрастанию версии
+MIGRATIONS = [
+    (1, "Базовая схема users и payments", _migration_1),
+    (2, "Индексы подписок, статистики и платежей", _migration_2),
+    (3, "Кэш file_id для локальных медиафайлов", _migration_3),
+    (4, "Очередь исходящих сообщений", _migration_4),
+    (5, "Отметка отправленных напоминаний о подписке", _migration_5),
+    (6, "Служебная таблица bot_state", _migration_6),
+    (7, "Журнал рассылки сигналов", _migration_7),
+    (8, "Отметка недоступных получателей", _migration_8),
+    (9, "Покрывающий индекс активных подписок с unreachable_at", _migration_9),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def get_version(conn):
+    """Текущая версия схемы"""
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def apply_migrations(conn):
+    """Применение недостающих миграций; возвращает список примененных версий"""
+    if get_version(conn) >= LATEST_VERSION:
+        return []
+
+    applied = []
+    for version, description, migrate in MIGRATIONS:
+        # BEGIN IMMEDIATE сразу берет блокировку записи, поэтому версию
+        # перечитываем уже внутри транзакции (мог мигрировать другой процесс)
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if get_version(conn) >= version:
+                conn.rollback()
+                continue
+            migrate(conn)
+            conn.execute(f"PRAGMA user_version = {version}")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+        applied.append(version)
+        print(f"[DB] Применена миграция {version}: {description}")
+
+    return applied
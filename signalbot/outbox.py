@@ -0,0 +1,140 @@
+import json
+import threading
+import time
+
+# Приоритеты доставки: меньше — раньше
+PRIORITY_SIGNAL = 0
+PRIORITY_PAYMENT = 1
+PRIORITY_BROADCAST = 2
+PRIORITY_LOG = 3
+
+# Результаты доставки, которые возвращает deliver_fn
+DELIVERED = "delivered"
+RETRY = "retry"
+FAILED = "failed"
+# Лимит отправки исчерпан: вместо описания ошибки deliver_fn возвращает задержку в секундах
+DEFERRED = "deferred"
+
+
+class Outbox:
+    """Персистентная очередь исходящих запросов с пулом отправителей
+
+    Запросы хранятся в таблице outbound_queue и переживают перезапуск.
+    Рабочие потоки забирают запросы по приоритету, при временной ошибке
+    откладывают их с экспоненциальной задержкой, а после max_attempts
+    попыток (или при постоянной ошибке) переводят в статус dead. Запрос в
+    чат с исчерпанным лимитом (DEFERRED) не занимает поток ожиданием, а
+    откладывается через next_attempt_at без траты попытки, поэтому логи в
+    канал с лимитом 20 в минуту не задерживают платежи и сигналы.
+    """
+
+    def __init__(self, db, deliver_fn, workers=4, max_attempts=6, base_delay=2.0, max_delay=300.0, poll_interval=1.0):
+        """deliver_fn(method, params) -> (DELIVERED | RETRY | FAILED, описание ошибки)"""
+        self.db = db
+        self.deliver_fn = deliver_fn
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.poll_interval = poll_interval
+
+        self.running = False
+        self._wakeup = threading.Event()
+        self._threads = []
+        self._lock = threading.Lock()
+        self.delivered = 0
+        self.retried = 0
+        self.dead = 0
+        self.deferred = 0
+
+    def enqueue(self, method, params, priority):
+        """Постановка одного запроса в очередь"""
+        self.enqueue_many(method, [params], priority)
+
+    def enqueue_many(self, method, params_list, priority):
+        """Постановка пачки однотипных запросов одной транзакцией"""
+        if not params_list:
+            return
+        self.db.enqueue_outbound(
+            method,
+            [json.dumps(params, ensure_ascii=False) for params in params_list],
+            priority
+        )
+        self._wakeup.set()
+
+    def start(self):
+        """Запуск рабочих потоков; незавершенные отправки возвращаются в очередь"""
+        if self.running:
+            return
+        restored = self.db.reset_outbound_in_flight()
+        if restored:
+            print(f"[OUTBOX] Возвращено в очередь после перезапуска: {restored}")
+
+        self.running = True
+        for index in range(self.workers):
+            thread = threading.Thread(target=self._worker, name=f"outbox-{index}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout=5):
+        self.running = False
+        self._wakeup.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def _backoff(self, attempts):
+        return min(self.max_delay, self.base_delay * 2 ** (attempts - 1))
+
+    def _worker(self):
+        while self.running:
+            try:
+                row = self.db.claim_outbound(time.time())
+            except Exception as e:
+                print(f"[ERROR] Очередь исходящих: {e}")
+                row = None
+
+            if row is None:
+                self._wakeup.wait(self.poll_interval)
+                self._wakeup.clear()
+                continue
+
+            queue_id, method, params, priority, attempts = row
+            try:
+                result, error = self.deliver_fn(method, json.loads(params))
+            except Exception as e:
+                result, error = RETRY, str(e)
+
+            try:
+                if result == DELIVERED:
+                    self.db.complete_outbound(queue_id)
+                    with self._lock:
+                        self.delivered += 1
+                elif result == DEFERRED:
+                    self.db.defer_outbound(queue_id, time.time() + error)
+                    with self._lock:
+                        self.deferred += 1
+                elif result == RETRY and attempts < self.max_attempts:
+                    self.db.retry_outbound(queue_id, time.time() + self._backoff(attempts), error)
+                    with self._lock:
+                        self.retried += 1
+                else:
+                    self.db.dead_letter_outbound(queue_id, error)
+                    with self._lock:
+                        self.dead += 1
+                    print(f"[OUTBOX] {method} #{queue_id} не доставлен: {error}")
+            except Exception as e:
+                print(f"[ERROR] Очередь исходящих: {e}")
+
+    def get_stats(self):
+        stats = self.db.get_outbound_stats()
+        with self._lock:
+            return {
+                "pending": stats.get("pending", 0),
+                "sending": stats.get("sending", 0),
+                "dead": stats.get("dead", 0),
+                "delivered": self.delivered,
+                "retried": self.retried,
+                "deferred": self.deferred,
+                "dead_total": self.dead
+            }
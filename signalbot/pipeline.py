@@ -0,0 +1,89 @@
+import threading
+import time
+from collections import deque
+
+from sharded_executor import ShardedExecutor
+
+# Сколько последних задержек хранится для перцентилей
+LATENCY_WINDOW = 1000
+
+
+class UpdatePipeline:
+    """Конвейер обновлений для режима long polling
+
+    Один поток-производитель непрерывно вызывает getUpdates и передает
+    обновления в ShardedExecutor по chat_id: обновления одного чата
+    обрабатываются строго по порядку, разных чатов — параллельно. Долгая
+    обработка (рассылка, пересылка сигнала) больше не задерживает следующий
+    getUpdates; при заполнении очереди производитель ждет, пока обработчики
+    ее разгрузят.
+    """
+
+    def __init__(self, bot, consumers=8, queue_size=1000, poll_timeout=30):
+        self.bot = bot
+        self.poll_timeout = poll_timeout
+        self.executor = ShardedExecutor(consumers, queue_size, "update-consumer", bot.log_update_error)
+        self.running = False
+        self._producer_thread = None
+        self._lock = threading.Lock()
+        self._latencies = deque(maxlen=LATENCY_WINDOW)
+
+    def start(self):
+        self.running = True
+        self.executor.start()
+        self._producer_thread = threading.Thread(target=self._producer, name="update-producer", daemon=True)
+        self._producer_thread.start()
+
+    def stop(self, timeout=5):
+        """Остановка опроса; уже принятые обновления дообрабатываются"""
+        self.running = False
+        self.executor.stop(timeout)
+        self._producer_thread.join(timeout)
+
+    def _producer(self):
+        offset = None
+        while self.running and self.bot.running:
+            try:
+                started = time.monotonic()
+                updates = self.bot.get_updates(offset, timeout=self.poll_timeout)
+                received_at = time.monotonic()
+                if not updates and received_at - started < 1:
+                    # Мгновенный пустой ответ — это ошибка сети или 409, а не long polling
+                    time.sleep(1)
+                for update in updates:
+                    offset = update["update_id"] + 1
+                    # Блокирующая постановка: переполненная очередь притормаживает опрос
+                    self.executor.submit(self.bot.get_update_chat_id(update), self._process, update, received_at)
+            except Exception as e:
+                error_msg = f"[ERROR] Получение обновлений: {e}"
+                print(error_msg)
+                self.bot.send_log(error_msg)
+                time.sleep(3)
+
+    def _process(self, update, received_at):
+        try:
+            self.bot.handle_update(update)
+        finally:
+            latency = time.monotonic() - received_at
+            with self._lock:
+                self._latencies.append(latency)
+
+    def get_stats(self):
+        """Глубина очередей и задержка от получения обновления до конца обработки"""
+        executor_stats = self.executor.get_stats()
+        with self._lock:
+            latencies = sorted(self._latencies)
+        stats = {
+            "received": executor_stats["submitted"],
+            "processed": executor_stats["completed"],
+            "depth": executor_stats["backlog"],
+            "max_depth": executor_stats["max_backlog"],
+            "shards": executor_stats["shards"]
+        }
+        if latencies:
+            stats["p50_ms"] = latencies[len(latencies) // 2] * 1000
+            stats["p99_ms"] = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000
+            stats["max_ms"] = latencies[-1] * 1000
+        else:
+            stats["p50_ms"] = stats["p99_ms"] = stats["max_ms"] = 0.0
+        return stats
@@ -0,0 +1,130 @@
+import threading
+import time
+
+
+class TokenBucket:
+    """Классический token bucket: rate токенов в секунду, не больше capacity"""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+
+    def _refill(self, now):
+        if now > self.updated:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+
+    def try_take(self, now):
+        """Забрать токен; возвращает 0 при успехе или сколько секунд подождать"""
+        if now < self.blocked_until:
+            return self.blocked_until - now
+        self._refill(now)
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def pause(self, seconds, now):
+        """Заблокировать корзину на seconds секунд (ответ 429 от Telegram)"""
+        self.blocked_until = max(self.blocked_until, now + seconds)
+        # Сразу после паузы разрешен ровно один запрос — повтор отклоненного
+        self.tokens = min(1.0, self.capacity)
+        self.updated = max(self.updated, self.blocked_until)
+
+    def is_idle(self, now):
+        self._refill(now)
+        return now >= self.blocked_until and self.tokens >= self.capacity
+
+
+class RateLimiter:
+    """Общий лимитер отправок: глобальная корзина плюс корзины на каждый чат"""
+
+    # Число корзин чатов, после которого удаляются простаивающие
+    MAX_CHAT_BUCKETS = 10000
+
+    def __init__(self, global_rate=30, chat_rate=1, group_rate_per_minute=20, chat_burst=3):
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.group_rate = group_rate_per_minute / 60.0
+        self.group_burst = group_rate_per_minute
+
+        self._lock = threading.Lock()
+        self._global = TokenBucket(global_rate, global_rate)
+        self._chats = {}
+        self.waits = 0
+        self.retries = 0
+
+    def _chat_bucket(self, chat_id, now):
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            if len(self._chats) >= self.MAX_CHAT_BUCKETS:
+                self._chats = {key: value for key, value in self._chats.items() if not value.is_idle(now)}
+            # Группы и каналы имеют отрицательный chat_id и более строгий лимит
+            if (isinstance(chat_id, int) and chat_id < 0) or (isinstance(chat_id, str) and chat_id.startswith(("-", "@"))):
+                bucket = TokenBucket(self.group_rate, self.group_burst)
+            else:
+                bucket = TokenBucket(self.chat_rate, self.chat_burst)
+            self._chats[chat_id] = bucket
+        return bucket
+
+    def _take(self, chat_id):
+        """Попытка забрать токены чата и глобальный; (задержка, ограничил ли лимит чата)"""
+        with self._lock:
+            now = time.monotonic()
+            if chat_id is not None:
+                bucket = self._chat_bucket(chat_id, now)
+                delay = bucket.try_take(now)
+                if delay:
+                    return delay, True
+            delay = self._global.try_take(now)
+            if delay and chat_id is not None:
+                # Возвращаем токен чата, раз глобальная корзина пуста
+                bucket.tokens = min(bucket.capacity, bucket.tokens + 1)
+            return delay, False
+
+    def try_acquire(self, chat_id=None):
+        """Разрешение без ожидания лимита чата: 0 при успехе или сколько секунд ждать корзину чата
+
+        Глобальная корзина освобождается за доли секунды, поэтому ее поток
+        дожидается сам; откладывать запрос имеет смысл только из-за лимита
+        конкретного чата или канала (1 в секунду, 20 в минуту).
+        """
+        while True:
+            delay, chat_limited = self._take(chat_id)
+            if not delay or chat_limited:
+                return delay
+            time.sleep(delay)
+
+    def acquire(self, chat_id=None):
+        """Блокирует поток, пока отправка в chat_id не станет разрешена"""
+        waited = False
+        while True:
+            delay, _ = self._take(chat_id)
+            if not delay:
+                if waited:
+                    with self._lock:
+                        self.waits += 1
+                return
+            waited = True
+            time.sleep(delay)
+
+    def retry_after(self, seconds, chat_id=None):
+        """Учесть parameters.retry_after из ответа 429"""
+        with self._lock:
+            now = time.monotonic()
+            self.retries += 1
+            if chat_id is not None:
+                self._chat_bucket(chat_id, now).pause(seconds, now)
+            else:
+                self._global.pause(seconds, now)
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                "chat_buckets": len(self._chats),
+                "waits": self.waits,
+                "retries": self.retries
+            }
@@ -0,0 +1,98 @@
+import threading
+from array import array
+from bisect import bisect_left
+from datetime import datetime
+
+
+class RecipientSet:
+    """Множество активных подписчиков в памяти для рассылок и пересылки сигналов
+
+    ID хранятся в отсортированном array('q') (8 байт на пользователя).
+    Множество обновляется слушателем статусов Database при активации,
+    продлении и истечении подписки, а также при отметке недоступности и ее
+    снятии; для активных слушатель проверяет пользователя тем же условием,
+    что и get_active_users. Раз в reconcile_interval секунд множество
+    сверяется с get_active_users на случай изменений в обход Database.
+    """
+
+    def __init__(self, db, reconcile_interval=600):
+        self.db = db
+        self.reconcile_interval = reconcile_interval
+        self._ids = array("q")
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self.reconciled_at = None
+        self.last_drift = 0
+
+    def reload(self):
+        """Полная загрузка из базы; возвращает число расхождений с памятью"""
+        ids = array("q", sorted(set(self.db.get_active_users())))
+        with self._lock:
+            drift = len(set(ids).symmetric_difference(self._ids))
+            self._ids = ids
+        self.reconciled_at = datetime.now()
+        self.last_drift = drift
+        return drift
+
+    def add(self, telegram_id):
+        with self._lock:
+            index = bisect_left(self._ids, telegram_id)
+            if index == len(self._ids) or self._ids[index] != telegram_id:
+                self._ids.insert(index, telegram_id)
+
+    def discard(self, telegram_id):
+        with self._lock:
+            index = bisect_left(self._ids, telegram_id)
+            if index < len(self._ids) and self._ids[index] == telegram_id:
+                del self._ids[index]
+
+    def __contains__(self, telegram_id):
+        with self._lock:
+            index = bisect_left(self._ids, telegram_id)
+            return index < len(self._ids) and self._ids[index] == telegram_id
+
+    def __len__(self):
+        return len(self._ids)
+
+    def snapshot(self, extra=()):
+        """Список получателей; extra (например, ADMIN_IDS) добавляются без повторов"""
+        with self._lock:
+            recipients = self._ids.tolist()
+        for telegram_id in extra:
+            if telegram_id not in self:
+                recipients.append(telegram_id)
+        return recipients
+
+    def on_status_change(self, telegram_id, status, end_date):
+        """Слушатель Database: добавление активных получателей, удаление всех остальных"""
+        # Срок, пожизненный план и недоступность проверяет база, как в get_active_users
+        if status == "active" and self.db.is_active_recipient(telegram_id):
+            self.add(telegram_id)
+        else:
+            self.discard(telegram_id)
+
+    def start(self):
+        """Подписка на изменения статусов и фоновая сверка с базой"""
+        self.db.add_status_listener(self.on_status_change)
+        self.reload()
+        threading.Thread(target=self._reconcile_loop, name="recipients-reconcile", daemon=True).start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _reconcile_loop(self):
+        while not self._stop.wait(self.reconcile_interval):
+            try:
+                drift = self.reload()
+                if drift:
+                    print(f"[RECIPIENTS] Сверка с базой: исправлено расхождений {drift}")
+            except Exception as e:
+                print(f"[ERROR] Сверка получателей: {e}")
+
+    def get_stats(self):
+        return {
+            "size": len(self._ids),
+            "bytes": self._ids.itemsize * len(self._ids),
+            "reconciled_at": self.reconciled_at,
+            "last_drift": self.last_drift
+        }
@@ -0,0 +1,117 @@
+"""Таблицы маршрутизации сообщений и callback-запросов
+
+Вместо цепочки if/elif каждое входящее сообщение находит обработчик
+одним поиском в словаре:
+
+- кнопки reply-клавиатуры — точное совпадение текста;
+- команды — по первому слову (/confirm 123, /start@SignalBot);
+- callback data — точное совпадение или префикс до первого "_" (confirm_<id>);
+- состояния user_state — точное совпадение.
+
+Права администратора объявляются у маршрута и проверяются до вызова
+обработчика.
+"""
+
+TEXT = "text"
+COMMAND = "command"
+CALLBACK = "callback"
+STATE = "state"
+
+
+class Request:
+    """Данные входящего сообщения или callback-запроса для обработчика"""
+
+    __slots__ = ("chat_id", "user_id", "username", "text", "args", "user_state", "message")
+
+    def __init__(self, chat_id, user_id, username=None, text="", args=None, user_state=None, message=None):
+        self.chat_id = chat_id
+        self.user_id = user_id
+        self.username = username
+        self.text = text
+        self.args = args or []
+        self.user_state = user_state
+        self.message = message
+
+
+class Route:
+    __slots__ = ("kind", "key", "handler", "admin")
+
+    def __init__(self, kind, key, handler, admin=False):
+        self.kind = kind
+        self.key = key
+        self.handler = handler
+        self.admin = admin
+
+
+class Router:
+    """Маршрутизатор с поиском обработчика за O(1)"""
+
+    def __init__(self, admin_ids, on_denied):
+        """on_denied(request, route) вызывается, если маршрут только для администраторов"""
+        self.admin_ids = frozenset(admin_ids)
+        self.on_denied = on_denied
+        self._texts = {}
+        self._commands = {}
+        self._callbacks = {}
+        self._callback_prefixes = {}
+        self._states = {}
+
+    def add_text(self, text, handler, admin=False):
+        self._texts[text] = Route(TEXT, text, handler, admin)
+
+    def add_command(self, command, handler, admin=False):
+        """command без слэша: "confirm" для /confirm"""
+        self._commands["/" + command] = Route(COMMAND, command, handler, admin)
+
+    def add_callback(self, data, handler, admin=False):
+        self._callbacks[data] = Route(CALLBACK, data, handler, admin)
+
+    def add_callback_prefix(self, prefix, handler, admin=False):
+        """prefix заканчивается на "_": обработчик получает остаток data в request.args[0]"""
+        if not prefix.endswith("_") or "_" in prefix[:-1]:
+            raise ValueError(f"Префикс callback должен содержать один '_' в конце: {prefix}")
+        self._callback_prefixes[prefix] = Route(CALLBACK, prefix, handler, admin)
+
+    def add_state(self, state, handler, admin=False):
+        self._states[state] = Route(STATE, state, handler, admin)
+
+    def match_text(self, text):
+        """Маршрут для текста сообщения и аргументы команды"""
+        route = self._texts.get(text)
+        if route is not None:
+            return route, []
+
+        if text.startswith("/"):
+            parts = text.split()
+            # /command@BotName в группах приходит с именем бота
+            command = parts[0].split("@", 1)[0]
+            route = self._commands.get(command)
+            if route is not None:
+                return route, parts[1:]
+        return None, []
+
+    def match_callback(self, data):
+        """Маршрут для callback data и аргументы (остаток после префикса)"""
+        route = self._callbacks.get(data)
+        if route is not None:
+            return route, []
+
+        prefix, separator, rest = data.partition("_")
+        if separator:
+            route = self._callback_prefixes.get(prefix + separator)
+            if route is not None:
+                return route, [rest]
+        return None, []
+
+    def match_state(self, user_state):
+        if user_state is None:
+            return None
+        return self._states.get(user_state)
+
+    def dispatch(self, route, request):
+        """Вызов обработчика с проверкой прав администратора"""
+        if route.admin and request.user_id not in self.admin_ids:
+            self.on_denied(request, route)
+            return False
+        route.handler(request)
+        return True
@@ -0,0 +1,158 @@
+import heapq
+import threading
+import time
+from datetime import datetime, timedelta
+
+# Типы событий в очереди
+REMIND = "remind"
+EXPIRE = "expire"
+
+
+class ExpiryScheduler:
+    """Точный планировщик окончания подписок
+
+    Сроки активных подписок хранятся в куче (min-heap) по времени события:
+    напоминание за remind_before до end_date и само истечение. Поток спит
+    ровно до ближайшего события. Изменения статусов приходят от Database
+    через add_status_listener; устаревшие записи кучи не удаляются сразу,
+    а пропускаются при извлечении (сверка с актуальным end_date пользователя).
+    При запуске и раз в resync_interval секунд очередь перестраивается из базы.
+    """
+
+    def __init__(self, db, on_expire, on_remind, remind_before=timedelta(days=1), resync_interval=6 * 3600):
+        """on_expire() переводит просроченные подписки; on_remind(users) — список {"telegram_id", "end_date"}"""
+        self.db = db
+        self.on_expire = on_expire
+        self.on_remind = on_remind
+        self.remind_before = remind_before
+        self.resync_interval = resync_interval
+
+        self._heap = []
+        self._end_dates = {}
+        self._reminded = {}
+        self._condition = threading.Condition()
+        self._thread = None
+        self.running = False
+        self.fired_reminders = 0
+        self.fired_expiries = 0
+
+    def start(self):
+        self.rehydrate()
+        self.db.add_status_listener(self.on_status_change)
+        self.running = True
+        self._thread = threading.Thread(target=self._run, name="expiry-scheduler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        with self._condition:
+            self.running = False
+            self._condition.notify()
+
+    def rehydrate(self):
+        """Загрузка сроков всех активных подписок из базы"""
+        rows = self.db.get_scheduled_subscriptions()
+        with self._condition:
+            self._heap = []
+            self._end_dates = {}
+            self._reminded = {}
+            for telegram_id, end_date, reminded_end_date in rows:
+                if reminded_end_date == end_date:
+                    self._reminded[telegram_id] = end_date
+                self._heap.extend(self._entries(telegram_id, end_date))
+            heapq.heapify(self._heap)
+            self._condition.notify()
+
+    def _entries(self, telegram_id, end_date):
+        """События пользователя для кучи (вызывается под блокировкой)"""
+        end_dt = self._parse(end_date)
+        if end_dt is None:
+            self._end_dates.pop(telegram_id, None)
+            return []
+        self._end_dates[telegram_id] = end_date
+        expire_at = end_dt.timestamp()
+        # Истечение с запасом в секунду: expire_users сравнивает end_date строго меньше текущего времени
+        entries = [(expire_at + 1, EXPIRE, telegram_id, end_date)]
+        if self._reminded.get(telegram_id) != end_date:
+            entries.append((expire_at - self.remind_before.total_seconds(), REMIND, telegram_id, end_date))
+        return entries
+
+    @staticmethod
+    def _parse(end_date):
+        if not end_date:
+            return None
+        try:
+            return datetime.fromisoformat(end_date)
+        except (ValueError, TypeError):
+            return None
+
+    def on_status_change(self, telegram_id, status, end_date):
+        """Слушатель Database: активация, продление или снятие подписки"""
+        with self._condition:
+            if status == "active" and end_date:
+                if self._end_dates.get(telegram_id) == end_date:
+                    return
+                # Новые записи добавляются в кучу; старые отсеются при извлечении
+                for entry in self._entries(telegram_id, end_date):
+                    heapq.heappush(self._heap, entry)
+                self._condition.notify()
+            else:
+                self._end_dates.pop(telegram_id, None)
+
+    def _pop_due(self, now):
+        """Извлечение наступивших событий с пропуском устаревших (под блокировкой)"""
+        reminders = []
+        expire = False
+        while self._heap and self._heap[0][0] <= now:
+            event_at, kind, telegram_id, end_date = heapq.heappop(self._heap)
+            if self._end_dates.get(telegram_id) != end_date:
+                continue
+            if kind == EXPIRE:
+                expire = True
+                self._end_dates.pop(telegram_id, None)
+            elif event_at + self.remind_before.total_seconds() <= now:
+                # Подписка уже истекла (например, бот был выключен) — напоминать поздно
+                continue
+            elif self._reminded.get(telegram_id) != end_date:
+                self._reminded[telegram_id] = end_date
+                reminders.append({"telegram_id": telegram_id, "end_date": end_date})
+        return reminders, expire
+
+    def _run(self):
+        next_resync = time.monotonic() + self.resync_interval
+        while True:
+            with self._condition:
+                if not self.running:
+                    return
+                now = time.time()
+                reminders, expire = self._pop_due(now)
+                if not reminders and not expire:
+                    timeout = next_resync - time.monotonic()
+                    if self._heap:
+                        timeout = min(timeout, self._heap[0][0] - now)
+                    self._condition.wait(max(0.0, timeout))
+
+            try:
+                if reminders:
+                    self.fired_reminders += len(reminders)
+                    self.on_remind(reminders)
+                    self.db.mark_reminded([(user["end_date"], user["telegram_id"]) for user in reminders])
+                if expire:
+                    self.fired_expiries += 1
+                    self.on_expire()
+                if time.monotonic() >= next_resync:
+                    next_resync = time.monotonic() + self.resync_interval
+                    self.rehydrate()
+            except Exception as e:
+                print(f"[ERROR] Планировщик подписок: {e}")
+                time.sleep(60)
+
+    def get_stats(self):
+        with self._condition:
+            next_event = self._heap[0][0] if self._heap else None
+            return {
+                "scheduled": len(self._end_dates),
+                "heap_size": len(self._heap),
+                "next_event": datetime.fromtimestamp(next_event) if next_event else None,
+                "reminders": self.fired_reminders,
+                "expiries": self.fired_expiries
+            }
@@ -0,0 +1,98 @@
+import queue
+import threading
+
+
+class ShardedExecutor:
+    """Пул потоков с сохранением порядка задач внутри одного ключа
+
+    Ключ (обычно chat_id) хэшируется на одну из фиксированных очередей,
+    у каждой очереди свой рабочий поток. Задачи разных пользователей
+    выполняются параллельно, а задачи одного пользователя — строго по
+    очереди, от чего зависит машина состояний user_state.
+    """
+
+    _STOP = object()
+
+    def __init__(self, shards=8, queue_size=1000, name="shard", on_error=None):
+        """queue_size — общий размер очередей, делится поровну между шардами"""
+        shard_size = max(1, queue_size // shards)
+        self.queues = [queue.Queue(maxsize=shard_size) for _ in range(shards)]
+        self.name = name
+        self.on_error = on_error
+        self._threads = []
+        self._lock = threading.Lock()
+        self.submitted = 0
+        self.completed = 0
+        self.rejected = 0
+        self.max_backlog = 0
+
+    def shard_for(self, key):
+        return hash(key) % len(self.queues)
+
+    def start(self):
+        for index, tasks in enumerate(self.queues):
+            thread = threading.Thread(target=self._worker, args=(tasks,), name=f"{self.name}-{index}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def submit(self, key, fn, *args, block=True):
+        """Постановка задачи в очередь ключа
+
+        При block=True переполненная очередь ждет освобождения места
+        (обратное давление на источник), при block=False задача отклоняется
+        и возвращается False.
+        """
+        tasks = self.queues[self.shard_for(key)]
+        try:
+            tasks.put((fn, args), block=block)
+        except queue.Full:
+            with self._lock:
+                self.rejected += 1
+            return False
+
+        backlog = tasks.qsize()
+        with self._lock:
+            self.submitted += 1
+            if backlog > self.max_backlog:
+                self.max_backlog = backlog
+        return True
+
+    def stop(self, timeout=5):
+        """Остановка после выполнения уже поставленных задач"""
+        for tasks in self.queues:
+            try:
+                tasks.put(self._STOP, timeout=timeout)
+            except queue.Full:
+                pass
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def _worker(self, tasks):
+        while True:
+            item = tasks.get()
+            if item is self._STOP:
+                return
+            fn, args = item
+            try:
+                fn(*args)
+            except Exception as e:
+                if self.on_error:
+                    self.on_error(e)
+                else:
+                    print(f"[ERROR] {self.name}: {e}")
+            with self._lock:
+                self.completed += 1
+
+    def get_stats(self):
+        """Очередь каждого шарда и общие счетчики"""
+        backlogs = [tasks.qsize() for tasks in self.queues]
+        with self._lock:
+            return {
+                "shards": backlogs,
+                "backlog": sum(backlogs),
+                "max_backlog": self.max_backlog,
+                "submitted": self.submitted,
+                "completed": self.completed,
+                "rejected": self.rejected
+            }
@@ -0,0 +1,158 @@
+import queue
+import threading
+import time
+
+
+class SignalIngestor:
+    """Отдельная стадия приема постов сигнального канала
+
+    submit вызывается для каждой пачки обновлений, отбирает посты канала и
+    сразу возвращает управление. Единственный рабочий поток передает новые
+    посты в deliver_fn (пересылка подписчикам) строго по порядку message_id
+    и после этого сохраняет последний переданный message_id в bot_state,
+    поэтому после перезапуска посты не теряются и не пересылаются повторно.
+    Посты с media_group_id (альбомы) копятся album_window секунд после
+    последней части и передаются одной пачкой вместе с постами, пришедшими
+    за это время. Если deliver_fn выбросил исключение, пачка остается в
+    ожидании и повторяется с растущей задержкой; курсор сдвигается только
+    после успешной передачи.
+    """
+
+    def __init__(self, db, channel_id, deliver_fn, album_window=1.5, max_queue=1000, retry_delay=2.0, max_retry_delay=60.0):
+        """deliver_fn(batches) — новые посты канала по возрастанию message_id, сгруппированные по альбомам"""
+        self.db = db
+        self.channel_id = channel_id
+        self.deliver_fn = deliver_fn
+        self.state_key = f"signal_last_message_id:{channel_id}"
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.album_window = album_window
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+        self.last_message_id = None
+        self._pending = {}
+        # Момент передачи накопленного: конец окна альбома или повтор после ошибки
+        self._flush_deadline = None
+        self._failures = 0
+        self._thread = None
+        self.received = 0
+        self.delivered = 0
+        self.albums = 0
+        self.failed_attempts = 0
+
+    def start(self):
+        value = self.db.get_state(self.state_key)
+        self.last_message_id = int(value) if value is not None else None
+        self._thread = threading.Thread(target=self._run, name="signal-ingest", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=5):
+        if self._thread:
+            self.queue.put(None)
+            self._thread.join(timeout)
+            self._thread = None
+
+    def submit(self, updates):
+        """Отбор постов сигнального канала из пачки обновлений; True, если такие были"""
+        found = False
+        for update in updates:
+            message = update.get("channel_post") or update.get("edited_channel_post")
+            if message and message.get("chat", {}).get("id") == self.channel_id:
+                self.queue.put(message)
+                self.received += 1
+                found = True
+        return found
+
+    def _drain(self, first):
+        """Все посты, уже стоящие в очереди, забираются вместе (посты одного альбома приходят пачкой)"""
+        messages = [first]
+        while True:
+            try:
+                message = self.queue.get_nowait()
+            except queue.Empty:
+                return messages, False
+            if message is None:
+                return messages, True
+            messages.append(message)
+
+    @staticmethod
+    def group_albums(messages):
+        """Разбиение постов (по возрастанию message_id) на пачки: альбом целиком или одиночный пост"""
+        batches = []
+        for message in messages:
+            media_group_id = message.get("media_group_id")
+            if media_group_id and batches and batches[-1][-1].get("media_group_id") == media_group_id:
+                batches[-1].append(message)
+            else:
+                batches.append([message])
+        return batches
+
+    def _flush(self):
+        """Передача накопленных постов; False, если deliver_fn не справился и нужен повтор"""
+        ordered = [self._pending[message_id] for message_id in sorted(self._pending)]
+        batches = self.group_albums(ordered)
+        try:
+            self.deliver_fn(batches)
+        except Exception as e:
+            # Посты остаются в ожидании; повторная рассылка не задвоится благодаря журналу доставки
+            self.failed_attempts += 1
+            delay = min(self.max_retry_delay, self.retry_delay * 2 ** self._failures)
+            self._failures += 1
+            self._flush_deadline = time.monotonic() + delay
+            print(f"[ERROR] Пересылка сигнала, повтор через {delay:.1f} с: {e}")
+            return False
+
+        self._pending = {}
+        self._flush_deadline = None
+        self._failures = 0
+        self.delivered += len(ordered)
+        self.albums += sum(1 for batch in batches if len(batch) > 1)
+        self.last_message_id = ordered[-1]["message_id"]
+        try:
+            self.db.set_state(self.state_key, str(self.last_message_id))
+        except Exception as e:
+            print(f"[ERROR] Сохранение последнего сигнала: {e}")
+        return True
+
+    def _run(self):
+        while True:
+            timeout = None
+            if self._flush_deadline is not None:
+                timeout = max(0.0, self._flush_deadline - time.monotonic())
+            try:
+                first = self.queue.get(timeout=timeout)
+            except queue.Empty:
+                # Окно альбома истекло или пора повторить — пересылаем все накопленное
+                self._flush()
+                continue
+            if first is None:
+                if self._pending:
+                    self._flush()
+                return
+            messages, stopping = self._drain(first)
+
+            # Правки уже пересланных постов и повторы после перезапуска пропускаются
+            for message in messages:
+                message_id = message.get("message_id")
+                if self.last_message_id is None or message_id > self.last_message_id:
+                    self._pending[message_id] = message
+                    if message.get("media_group_id") and not self._failures:
+                        # Части альбома приходят отдельными обновлениями — ждем остальные
+                        self._flush_deadline = time.monotonic() + self.album_window
+
+            if stopping:
+                if self._pending:
+                    self._flush()
+                return
+            if self._pending and self._flush_deadline is None:
+                self._flush()
+
+    def get_stats(self):
+        return {
+            "received": self.received,
+            "delivered": self.delivered,
+            "albums": self.albums,
+            "failed_attempts": self.failed_attempts,
+            "pending": len(self._pending),
+            "backlog": self.queue.qsize(),
+            "last_message_id": self.last_message_id
+        }
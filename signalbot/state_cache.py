@@ -0,0 +1,64 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class StateCache:
+    """LRU-кэш состояний пользователей (user_state) с ограничением размера и TTL
+
+    Кэш работает по схеме write-through: источник истины — таблица users,
+    поэтому после перезапуска кэш просто начинает с нуля.
+    """
+
+    def __init__(self, max_size=10000, ttl=600):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, user_id):
+        """Возвращает (найдено, состояние)"""
+        with self._lock:
+            entry = self._data.get(user_id)
+            if entry is not None:
+                state, expires_at = entry
+                if expires_at > time.monotonic():
+                    self._data.move_to_end(user_id)
+                    self.hits += 1
+                    return True, state
+                del self._data[user_id]
+            self.misses += 1
+            return False, None
+
+    def _store(self, user_id, state):
+        self._data[user_id] = (state, time.monotonic() + self.ttl)
+        self._data.move_to_end(user_id)
+        while len(self._data) > self.max_size:
+            self._data.popitem(last=False)
+
+    def set(self, user_id, state):
+        """Запись нового состояния (после записи в базу)"""
+        with self._lock:
+            self._store(user_id, state)
+
+    def add(self, user_id, state):
+        """Заполнение после чтения из базы: не затирает более свежую запись другого потока"""
+        with self._lock:
+            if user_id not in self._data:
+                self._store(user_id, state)
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._data.pop(user_id, None)
+
+    def get_stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0
+            }
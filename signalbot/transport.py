@@ -0,0 +1,230 @@
+import json as jsonlib
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+
+class RawJSON(str):
+    """Уже сериализованный JSON: вставляется в тело запроса как есть, без повторного кодирования"""
+
+    __slots__ = ()
+
+
+_encoder = jsonlib.JSONEncoder(ensure_ascii=False, separators=(",", ":"))
+
+
+def encode_json(params):
+    """Кодирование параметров запроса в JSON с подстановкой значений RawJSON без изменений"""
+    plain = {}
+    raw = []
+    for key, value in params.items():
+        if isinstance(value, RawJSON):
+            raw.append(f"{_encoder.encode(key)}:{value}")
+        else:
+            plain[key] = value
+    body = _encoder.encode(plain)
+    if raw:
+        separator = "," if plain else ""
+        body = f"{body[:-1]}{separator}{','.join(raw)}}}"
+    return body.encode("utf-8")
+
+
+JSON_HEADERS = {"Content-Type": "application/json"}
+
+
+class RateLimited(Exception):
+    """Отправка без ожидания невозможна: лимит исчерпан на retry_after секунд"""
+
+    def __init__(self, retry_after):
+        super().__init__(f"лимит отправки, повтор через {retry_after:.1f} с")
+        self.retry_after = retry_after
+
+# Ответы Telegram, после которых писать в чат бесполезно: (HTTP-код, фрагмент описания, причина)
+UNREACHABLE_ERRORS = (
+    (403, "bot was blocked by the user", "blocked"),
+    (403, "user is deactivated", "deactivated"),
+    (400, "chat not found", "chat_not_found")
+)
+
+# Методы с from_chat_id: «chat not found» может относиться к исходному каналу, а не к получателю
+SOURCE_CHAT_METHODS = ("forwardMessage", "forwardMessages", "copyMessage", "copyMessages")
+
+
+def unreachable_reason(response, method=None):
+    """Причина недоступности получателя по ответу Telegram или None"""
+    if response.status_code not in (400, 403):
+        return None
+    text = response.text.lower()
+    for status_code, fragment, reason in UNREACHABLE_ERRORS:
+        if status_code == 400 and method in SOURCE_CHAT_METHODS:
+            continue
+        if response.status_code == status_code and fragment in text:
+            return reason
+    return None
+
+
+class _CountingAdapter(HTTPAdapter):
+    """HTTPAdapter, который сообщает о каждом новом TCP/TLS-соединении"""
+
+    def __init__(self, on_new_connection, **kwargs):
+        self._on_new_connection = on_new_connection
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        on_new_connection = self._on_new_connection
+
+        class CountingHTTPConnectionPool(HTTPConnectionPool):
+            def _new_conn(self):
+                on_new_connection()
+                return super()._new_conn()
+
+        class CountingHTTPSConnectionPool(HTTPSConnectionPool):
+            def _new_conn(self):
+                on_new_connection()
+                return super()._new_conn()
+
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": CountingHTTPConnectionPool,
+            "https": CountingHTTPSConnectionPool
+        }
+
+
+class TelegramTransport:
+    """HTTP-транспорт к Telegram Bot API с постоянным пулом keep-alive соединений"""
+
+    def __init__(self, base_url, pool_size=32, limiter=None, max_retries=5):
+        """Создание сессии с пулом соединений заданного размера"""
+        self.base_url = base_url
+        self.pool_size = pool_size
+        self.limiter = limiter
+        self.max_retries = max_retries
+
+        self._lock = threading.Lock()
+        self._requests = 0
+        self._new_connections = 0
+        self._methods = {}
+
+        self.session = requests.Session()
+        adapter = _CountingAdapter(
+            self._count_new_connection,
+            pool_connections=4,
+            pool_maxsize=pool_size
+        )
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def _count_new_connection(self):
+        with self._lock:
+            self._new_connections += 1
+
+    def _record(self, method, elapsed, failed):
+        with self._lock:
+            self._requests += 1
+            stats = self._methods.get(method)
+            if stats is None:
+                stats = {"count": 0, "errors": 0, "total_time": 0.0, "max_time": 0.0}
+                self._methods[method] = stats
+            stats["count"] += 1
+            stats["total_time"] += elapsed
+            if elapsed > stats["max_time"]:
+                stats["max_time"] = elapsed
+            if failed:
+                stats["errors"] += 1
+
+    def post(self, method, json=None, data=None, files=None, timeout=30, block=True):
+        """POST-запрос к методу Bot API с учетом лимитов и повтором после 429
+
+        С block=False поток не ждет лимита чата и не повторяет запрос после
+        429, а выбрасывает RateLimited — вызывающий сам откладывает отправку.
+        Глобальный лимит поток дожидается в любом случае: он освобождается
+        за доли секунды, а откладывание только гоняло бы строки очереди.
+        """
+        params = json if json is not None else data
+        chat_id = params.get("chat_id") if isinstance(params, dict) else None
+
+        # Готовые фрагменты (клавиатуры) подставляются в тело без повторной сериализации
+        headers = None
+        if isinstance(json, dict) and any(isinstance(value, RawJSON) for value in json.values()):
+            json, data, headers = None, encode_json(json), JSON_HEADERS
+
+        attempt = 0
+        while True:
+            if self.limiter and chat_id is not None:
+                if block:
+                    self.limiter.acquire(chat_id)
+                else:
+                    delay = self.limiter.try_acquire(chat_id)
+                    if delay:
+                        raise RateLimited(delay)
+
+            response = self._post(method, json, data, files, timeout, headers)
+            if response.status_code != 429 or attempt >= self.max_retries:
+                return response
+
+            # Telegram сообщает, через сколько секунд можно повторить запрос
+            attempt += 1
+            retry_after = self._retry_after(response)
+            if not block:
+                if self.limiter:
+                    self.limiter.retry_after(retry_after, chat_id)
+                raise RateLimited(retry_after)
+            if self.limiter:
+                self.limiter.retry_after(retry_after, chat_id)
+            else:
+                time.sleep(retry_after)
+            for file_obj in (files or {}).values():
+                if hasattr(file_obj, "seek"):
+                    file_obj.seek(0)
+
+    def _retry_after(self, response):
+        try:
+            return float(response.json().get("parameters", {}).get("retry_after", 1))
+        except ValueError:
+            return 1.0
+
+    def _post(self, method, json, data, files, timeout, headers=None):
+        started = time.perf_counter()
+        failed = True
+        try:
+            response = self.session.post(
+                f"{self.base_url}/{method}",
+                json=json,
+                data=data,
+                files=files,
+                headers=headers,
+                timeout=timeout
+            )
+            failed = response.status_code >= 400
+            return response
+        finally:
+            self._record(method, time.perf_counter() - started, failed)
+
+    def get_stats(self):
+        """Счетчики пула (попадания/промахи) и задержки по методам"""
+        with self._lock:
+            requests_total = self._requests
+            misses = min(self._new_connections, requests_total)
+            methods = {}
+            for method, stats in self._methods.items():
+                methods[method] = {
+                    "count": stats["count"],
+                    "errors": stats["errors"],
+                    "avg_ms": stats["total_time"] / stats["count"] * 1000 if stats["count"] else 0.0,
+                    "max_ms": stats["max_time"] * 1000
+                }
+
+        return {
+            "pool_size": self.pool_size,
+            "requests": requests_total,
+            "pool_hits": requests_total - misses,
+            "pool_misses": misses,
+            "methods": methods
+        }
+
+    def close(self):
+        """Закрытие всех соединений пула"""
+        self.session.close()
@@ -0,0 +1,170 @@
+import hmac
+import json
+import secrets
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from sharded_executor import ShardedExecutor
+
+# Заголовок, в котором Telegram передает secret_token из setWebhook
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+# Telegram присылает обновления заметно меньше этого размера
+MAX_BODY_SIZE = 1024 * 1024
+
+
+class _WebhookHandler(BaseHTTPRequestHandler):
+    """Прием POST-запросов с обновлениями; ответ отдается сразу после постановки в очередь"""
+
+    server_version = "SignalBotWebhook"
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        webhook = self.server.webhook
+        if self.path.split("?", 1)[0] != webhook.path:
+            self._reply(404)
+            return
+
+        token = self.headers.get(SECRET_HEADER, "")
+        if not hmac.compare_digest(token.encode(), webhook.secret_token.encode()):
+            webhook.rejected += 1
+            self._reply(401)
+            return
+
+        length = int(self.headers.get("Content-Length") or 0)
+        if length <= 0 or length > MAX_BODY_SIZE:
+            self._reply(400)
+            return
+
+        try:
+            update = json.loads(self.rfile.read(length))
+        except ValueError:
+            self._reply(400)
+            return
+
+        try:
+            accepted = webhook.submit(update)
+        except Exception as e:
+            # Без ответа Telegram считает доставку неудачной и присылает обновление снова
+            webhook.bot.log_update_error(e)
+            self._reply(500)
+            return
+
+        # 503 заставит Telegram повторить доставку позже
+        self._reply(200 if accepted else 503)
+
+    def _reply(self, status):
+        self.send_response(status)
+        self.send_header("Content-Length", "0")
+        if status != 200:
+            # Тело запроса могло остаться непрочитанным — соединение дальше не используем
+            self.send_header("Connection", "close")
+            self.close_connection = True
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+
+class WebhookServer:
+    """Режим webhook: Telegram сам присылает обновления POST-запросами
+
+    HTTP-поток только проверяет secret_token и передает обновление в
+    ShardedExecutor по chat_id, поэтому обновления одного чата
+    обрабатываются строго по порядку, а разных чатов — параллельно.
+    Обработка та же, что и при long polling.
+    """
+
+    def __init__(self, bot, host="0.0.0.0", port=8443, path="/webhook", secret_token="",
+                 public_url="", workers=8, queue_size=1000):
+        self.bot = bot
+        self.host = host
+        self.port = port
+        self.path = path
+        # Без заданного секрета генерируем случайный: он передается в setWebhook
+        self.secret_generated = not secret_token
+        self.secret_token = secret_token or secrets.token_urlsafe(32)
+        self.public_url = public_url
+        self.executor = ShardedExecutor(workers, queue_size, "webhook", bot.log_update_error)
+        self.httpd = None
+        self.accepted = 0
+        self.rejected = 0
+        self.overflowed = 0
+
+    def submit(self, update):
+        """Постановка обновления в очередь его чата; False, если очередь переполнена"""
+        chat_id = self.bot.get_update_chat_id(update)
+        if not self.executor.submit(chat_id, self.bot.handle_update, update, block=False):
+            self.overflowed += 1
+            return False
+        self.accepted += 1
+        return True
+
+    def set_webhook(self):
+        """Регистрация webhook в Telegram (если задан публичный адрес)"""
+        if not self.public_url:
+            print("[WEBHOOK] WEBHOOK_URL не задан, регистрация в Telegram пропущена")
+            return
+        result = self.bot.send_request("setWebhook", {
+            "url": self.public_url,
+            "secret_token": self.secret_token,
+            "allowed_updates": ["message", "callback_query", "channel_post", "edited_channel_post"]
+        })
+        if result and result.get("ok"):
+            self.bot.send_log(f"[WEBHOOK] Зарегистрирован: {self.public_url}")
+        else:
+            self.bot.send_log(f"[WEBHOOK] Не удалось зарегистрировать webhook: {result}")
+
+    def start(self):
+        """Запуск рабочих потоков и HTTP-сервера в фоне"""
+        self.executor.start()
+        self.httpd = ThreadingHTTPServer((self.host, self.port), _WebhookHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.webhook = self
+        self.port = self.httpd.server_address[1]
+        threading.Thread(target=self.httpd.serve_forever, name="webhook-http", daemon=True).start()
+
+    def stop(self, timeout=5):
+        """Остановка приема и обработка уже принятых обновлений"""
+        if self.httpd:
+            self.httpd.shutdown()
+            self.httpd.server_close()
+        self.executor.stop(timeout)
+
+    def get_stats(self):
+        return {
+            "accepted": self.accepted,
+            "rejected": self.rejected,
+            "overflowed": self.overflowed,
+            "backlog": self.executor.get_stats()["backlog"]
+        }
+
+    def run(self):
+        """Запуск режима webhook до Ctrl+C"""
+        self.bot.running = True
+        self.bot.update_executor = self.executor
+        self.bot.start_background_threads()
+        self.start()
+        self.set_webhook()
+
+        print(f"[BOT] Запущен и готов (webhook на {self.host}:{self.port}{self.path})")
+        if self.secret_generated:
+            # Только в консоль, не в лог-канал: без секрета сервер отвечает 401
+            print(f"[WEBHOOK] WEBHOOK_SECRET не задан, сгенерирован секрет: {self.secret_token}")
+            print(f"[WEBHOOK] Локальная проверка: python benchmarks/replay_updates.py updates.json "
+                  f"--url http://127.0.0.1:{self.port}{self.path} --secret {self.secret_token}")
+        self.bot.send_log("[BOT] Запущен и готов (webhook)")
+
+        try:
+            while self.bot.running:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            print("\n[BOT] Остановка...")
+        finally:
+            self.bot.running = False
+            self.stop()
+            self.bot.signals.stop()
+            self.bot.send_log("[BOT] Остановлен")
+            self.bot.log_sink.close()
+            self.bot.outbox.stop()